@@ -0,0 +1,319 @@
+"""
+API JSON versionada (/api/v1) para reservas, salas, setores e equipamentos
+
+Cada recurso tem listagem com projeção de campos (?campos=id,data) e
+paginação por cursor (?apos=<id>&limite=N), leitura, criação (um objeto ou
+uma lista, gravada numa única unidade da thread de escrita), alteração parcial e exclusão
+individual ou em lote (DELETE na coleção com {"ids": [...]}).
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+from flask import Blueprint, jsonify, request, session
+import escrita
+from database import conexao, conflito_de_ocupacao, registrar_equipamentos_reserva
+from permissoes import requer_cargo
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+API_PAGINA = int(os.environ.get('API_PAGINA', 50))
+API_PAGINA_MAX = int(os.environ.get('API_PAGINA_MAX', 500))
+# Itens aceitos por requisição de criação ou exclusão em lote
+API_LOTE_MAX = int(os.environ.get('API_LOTE_MAX', 500))
+
+TODOS = ['admin', 'cotead', 'colaborador']
+ADMIN = ['admin']
+
+
+def _data_iso(valor):
+    return datetime.strptime(str(valor), '%Y-%m-%d').date().isoformat()
+
+
+# colunas: campo -> conversor dos valores recebidos (None = somente leitura)
+RECURSOS = {
+    'reservas': {
+        'tabela': 'Reservas',
+        'colunas': {
+            'id': None, 'nome': str, 'matricula': str, 'setor_id': int, 'sala_id': int,
+            'data': _data_iso, 'periodo': str, 'user_id': None, 'serie_id': None,
+        },
+        # Equipamentos vêm do livro (ReservaEquipamento), não de uma coluna
+        'virtuais': {
+            'equipamentos': '(SELECT json_group_array(re.equipamento_id) FROM ReservaEquipamento re '
+                            'WHERE re.reserva_id = t.id)',
+        },
+        'filtros': {
+            'data_inicio': ('t.data >= ?', _data_iso),
+            'data_fim': ('t.data <= ?', _data_iso),
+            'sala_id': ('t.sala_id = ?', int),
+            'setor_id': ('t.setor_id = ?', int),
+            'serie_id': ('t.serie_id = ?', int),
+        },
+        'leitura': TODOS, 'criacao': TODOS, 'alteracao': ADMIN,
+    },
+    'salas': {
+        'tabela': 'Sala',
+        'colunas': {'id': None, 'nome': str, 'capacidade': int},
+        'leitura': TODOS, 'criacao': ADMIN, 'alteracao': ADMIN,
+    },
+    'setores': {
+        'tabela': 'Setor',
+        'colunas': {'id': None, 'nome': str, 'email': str, 'telefone': str},
+        'leitura': TODOS, 'criacao': ADMIN, 'alteracao': ADMIN,
+    },
+    'equipamentos': {
+        'tabela': 'Equipamentos',
+        'colunas': {'id': None, 'nome': str, 'quantidade': int},
+        'leitura': TODOS, 'criacao': ADMIN, 'alteracao': ADMIN,
+    },
+}
+
+
+class ErroApi(Exception):
+    def __init__(self, mensagem, status=400, indice=None):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.status = status
+        self.indice = indice
+
+
+@api_v1.errorhandler(ErroApi)
+def _responder_erro(erro):
+    corpo = {'erro': erro.mensagem}
+    if erro.indice is not None:
+        corpo['indice'] = erro.indice
+    return jsonify(corpo), erro.status
+
+
+def _projecao(cfg):
+    """Expressões SQL dos campos pedidos em ?campos= (id sempre incluído)"""
+    disponiveis = dict((c, f't.{c}') for c in cfg['colunas'])
+    disponiveis.update(cfg.get('virtuais', {}))
+    pedidos = request.args.get('campos')
+    if not pedidos:
+        campos = list(disponiveis)
+    else:
+        campos = [c.strip() for c in pedidos.split(',') if c.strip()]
+        desconhecidos = [c for c in campos if c not in disponiveis]
+        if desconhecidos:
+            raise ErroApi(f'Campos desconhecidos: {", ".join(desconhecidos)}')
+        if 'id' not in campos:
+            campos.insert(0, 'id')
+    return campos, ', '.join(f'{disponiveis[c]} AS {c}' for c in campos)
+
+
+def _linhas_para_dicts(cfg, campos, linhas):
+    virtuais = cfg.get('virtuais', {})
+    return [{c: json.loads(v) if c in virtuais else v for c, v in zip(campos, linha)}
+            for linha in linhas]
+
+
+def _buscar_por_ids(cursor, cfg, ids):
+    campos, select = _projecao(cfg)
+    cursor.execute(f'''
+        SELECT {select} FROM {cfg['tabela']} t
+        WHERE t.id IN (SELECT value FROM json_each(?))
+        ORDER BY t.id
+    ''', (json.dumps(ids),))
+    return _linhas_para_dicts(cfg, campos, cursor.fetchall())
+
+
+def _valores(cfg, item, indice, parcial=False):
+    """Valida e converte os campos graváveis de um item recebido"""
+    if not isinstance(item, dict):
+        raise ErroApi('Cada item deve ser um objeto JSON', indice=indice)
+    gravaveis = {c: conv for c, conv in cfg['colunas'].items() if conv}
+    extras = set(item) - set(gravaveis) - set(cfg.get('virtuais', {}))
+    if extras:
+        raise ErroApi(f'Campos não graváveis: {", ".join(sorted(extras))}', indice=indice)
+    if not parcial:
+        faltando = [c for c in gravaveis if c not in item]
+        if faltando:
+            raise ErroApi(f'Campos obrigatórios ausentes: {", ".join(faltando)}', indice=indice)
+    valores = {}
+    for campo, conversor in gravaveis.items():
+        if campo in item:
+            try:
+                valores[campo] = conversor(item[campo])
+            except (TypeError, ValueError):
+                raise ErroApi(f'Valor inválido para {campo}', indice=indice)
+    return valores
+
+
+def _equipamentos(item, indice):
+    if 'equipamentos' not in item:
+        return None
+    try:
+        return [int(e) for e in item['equipamentos']]
+    except (TypeError, ValueError):
+        raise ErroApi('equipamentos deve ser uma lista de ids', indice=indice)
+
+
+def _gravar(recurso, operacao, indice=None):
+    """Executa operacao(cursor) na thread de escrita e traduz os erros do banco"""
+    try:
+        return escrita.executar(operacao)
+    except ErroApi:
+        raise
+    except sqlite3.IntegrityError as e:
+        if conflito_de_ocupacao(e):
+            raise ErroApi('Esta sala já está reservada para este período', 409, getattr(e, 'indice', indice))
+        raise ErroApi(f'Dados inválidos: {e}', 400, getattr(e, 'indice', indice))
+    except Exception as e:
+        print(f"Erro na API ({recurso}): {e}")
+        raise ErroApi('Erro ao gravar os dados', 500)
+
+
+def _registrar_rotas(recurso, cfg):
+    tabela = cfg['tabela']
+    colecao = f'/{recurso}'
+    item_url = f'/{recurso}/<int:id>'
+
+    @requer_cargo(cfg['leitura'], json=True)
+    def listar():
+        campos, select = _projecao(cfg)
+        condicoes, params = [], []
+        for nome, (condicao, conversor) in cfg.get('filtros', {}).items():
+            if request.args.get(nome):
+                try:
+                    params.append(conversor(request.args[nome]))
+                except ValueError:
+                    raise ErroApi(f'Valor inválido para {nome}')
+                condicoes.append(condicao)
+        apos = request.args.get('apos', type=int)
+        if apos is not None:
+            condicoes.append('t.id > ?')
+            params.append(apos)
+        limite = max(1, min(request.args.get('limite', API_PAGINA, type=int), API_PAGINA_MAX))
+        where = ('WHERE ' + ' AND '.join(condicoes)) if condicoes else ''
+
+        with conexao() as conn:
+            linhas = conn.execute(f'''
+                SELECT {select} FROM {tabela} t
+                {where}
+                ORDER BY t.id
+                LIMIT ?
+            ''', params + [limite + 1]).fetchall()
+        proximo = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximo = {'apos': linhas[-1][0]}
+        return jsonify({'itens': _linhas_para_dicts(cfg, campos, linhas), 'proximo': proximo})
+
+    @requer_cargo(cfg['leitura'], json=True)
+    def obter(id):
+        with conexao() as conn:
+            itens = _buscar_por_ids(conn.cursor(), cfg, [id])
+        if not itens:
+            raise ErroApi('Registro não encontrado', 404)
+        return jsonify(itens[0])
+
+    @requer_cargo(cfg['criacao'], json=True)
+    def criar():
+        corpo = request.get_json(silent=True)
+        lote = isinstance(corpo, list)
+        itens = corpo if lote else [corpo]
+        if not itens:
+            raise ErroApi('Nenhum item enviado')
+        if len(itens) > API_LOTE_MAX:
+            raise ErroApi(f'O lote excede o limite de {API_LOTE_MAX} itens', 413)
+        user_id = session.get('user_id')
+        preparados = [(_valores(cfg, item, i), _equipamentos(item, i) if recurso == 'reservas' else None)
+                      for i, item in enumerate(itens)]
+
+        def inserir(cursor):
+            ids = []
+            for i, (valores, equipamentos) in enumerate(preparados):
+                if recurso == 'reservas':
+                    valores['user_id'] = user_id
+                colunas = ', '.join(valores)
+                try:
+                    cursor.execute(f'INSERT INTO {tabela} ({colunas}) VALUES ({", ".join("?" * len(valores))})',
+                                   list(valores.values()))
+                except sqlite3.IntegrityError as e:
+                    e.indice = i
+                    raise
+                ids.append(cursor.lastrowid)
+                if equipamentos:
+                    esgotados = registrar_equipamentos_reserva(cursor, cursor.lastrowid, equipamentos)
+                    if esgotados:
+                        raise ErroApi(f'Equipamento indisponível neste período: {", ".join(esgotados)}', 409, i)
+            return ids
+
+        ids = _gravar(recurso, inserir)
+        with conexao() as conn:
+            criados = _buscar_por_ids(conn.cursor(), cfg, ids)
+        return jsonify({'itens': criados} if lote else criados[0]), 201
+
+    @requer_cargo(cfg['alteracao'], json=True)
+    def alterar(id):
+        item = request.get_json(silent=True)
+        valores = _valores(cfg, item, None, parcial=True)
+        equipamentos = _equipamentos(item, None) if recurso == 'reservas' else None
+        if not valores and equipamentos is None:
+            raise ErroApi('Nenhum campo para alterar')
+
+        def atualizar(cursor):
+            if valores:
+                definicoes = ', '.join(f'{c} = ?' for c in valores)
+                cursor.execute(f'UPDATE {tabela} SET {definicoes} WHERE id = ?', list(valores.values()) + [id])
+            cursor.execute(f'SELECT 1 FROM {tabela} WHERE id = ?', (id,))
+            if not cursor.fetchone():
+                raise ErroApi('Registro não encontrado', 404)
+            # Nova data ou período também reavaliam o estoque dos equipamentos já escolhidos
+            if recurso == 'reservas' and (equipamentos is not None or {'data', 'periodo'} & set(valores)):
+                if equipamentos is None:
+                    cursor.execute('SELECT equipamento_id FROM ReservaEquipamento WHERE reserva_id = ?', (id,))
+                    escolhidos = [linha[0] for linha in cursor.fetchall()]
+                else:
+                    escolhidos = equipamentos
+                esgotados = registrar_equipamentos_reserva(cursor, id, escolhidos)
+                if esgotados:
+                    raise ErroApi(f'Equipamento indisponível neste período: {", ".join(esgotados)}', 409)
+
+        _gravar(recurso, atualizar)
+        with conexao() as conn:
+            return jsonify(_buscar_por_ids(conn.cursor(), cfg, [id])[0])
+
+    @requer_cargo(cfg['alteracao'], json=True)
+    def excluir(id):
+        def remover(cursor):
+            cursor.execute(f'DELETE FROM {tabela} WHERE id = ?', (id,))
+            if cursor.rowcount == 0:
+                raise ErroApi('Registro não encontrado', 404)
+
+        _gravar(recurso, remover)
+        return '', 204
+
+    @requer_cargo(cfg['alteracao'], json=True)
+    def excluir_lote():
+        corpo = request.get_json(silent=True) or {}
+        try:
+            ids = sorted({int(i) for i in corpo.get('ids', [])})
+        except (AttributeError, TypeError, ValueError):
+            raise ErroApi('Envie {"ids": [...]} com ids inteiros')
+        if not ids:
+            raise ErroApi('Nenhum id enviado')
+        if len(ids) > API_LOTE_MAX:
+            raise ErroApi(f'O lote excede o limite de {API_LOTE_MAX} itens', 413)
+
+        def remover(cursor):
+            cursor.execute(f'DELETE FROM {tabela} WHERE id IN (SELECT value FROM json_each(?))',
+                           (json.dumps(ids),))
+            return cursor.rowcount
+
+        excluidos = _gravar(recurso, remover)
+        return jsonify({'excluidos': excluidos, 'solicitados': len(ids)})
+
+    api_v1.add_url_rule(colecao, f'listar_{recurso}', listar, methods=['GET'])
+    api_v1.add_url_rule(colecao, f'criar_{recurso}', criar, methods=['POST'])
+    api_v1.add_url_rule(colecao, f'excluir_lote_{recurso}', excluir_lote, methods=['DELETE'])
+    api_v1.add_url_rule(item_url, f'obter_{recurso}', obter, methods=['GET'])
+    api_v1.add_url_rule(item_url, f'alterar_{recurso}', alterar, methods=['PATCH'])
+    api_v1.add_url_rule(item_url, f'excluir_{recurso}', excluir, methods=['DELETE'])
+
+
+for _recurso, _cfg in RECURSOS.items():
+    _registrar_rotas(_recurso, _cfg)
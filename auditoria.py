@@ -0,0 +1,271 @@
+"""
+Auditoria assíncrona em lote
+
+Cada rota que altera dados gera um evento guardado num buffer em memória
+(deque.append, microssegundos por requisição). Uma thread por processo grava
+os eventos em lote no AuditLog pela thread de escrita, a cada
+AUDITORIA_INTERVALO segundos ou quando o buffer enche; o que estiver
+pendente é gravado no encerramento. Eventos mais antigos que
+AUDITORIA_RETENCAO_DIAS são movidos para tabelas mensais AuditLog_AAAAMM.
+
+Uso: python auditoria.py --rotacionar
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import escrita
+from database import conectar
+
+AUDITORIA_INTERVALO = float(os.environ.get('AUDITORIA_INTERVALO', 2.0))
+AUDITORIA_LOTE = int(os.environ.get('AUDITORIA_LOTE', 500))
+# Eventos além deste limite (banco indisponível por muito tempo) são descartados
+AUDITORIA_BUFFER_MAX = int(os.environ.get('AUDITORIA_BUFFER_MAX', 20000))
+AUDITORIA_RETENCAO_DIAS = int(os.environ.get('AUDITORIA_RETENCAO_DIAS', 90))
+
+# Rotas que alteram dados mesmo sendo GET (links de exclusão)
+ROTAS_GET_MUTAVEIS = {'deletar_reserva', 'deletar_equipamento', 'deletar_usuario', 'cancelar_serie'}
+# Rotas que não são auditadas (o formulário de login carrega a senha)
+ROTAS_IGNORADAS = {'login', 'logout', 'static'}
+# endpoint -> tipo do alvo (o id vem do parâmetro <id> da rota)
+ALVOS = {
+    'agendar_sala': 'reserva', 'editar_reserva': 'reserva', 'deletar_reserva': 'reserva',
+    'equipamentos': 'equipamento', 'editar_equipamento': 'equipamento', 'deletar_equipamento': 'equipamento',
+    'register': 'usuario', 'register_admin': 'usuario',
+    'editar_usuario': 'usuario', 'deletar_usuario': 'usuario',
+    'editar_serie': 'serie', 'cancelar_serie': 'serie',
+}
+# recurso da API JSON -> tipo do alvo
+ALVOS_API = {'reservas': 'reserva', 'salas': 'sala', 'setores': 'setor', 'equipamentos': 'equipamento'}
+COLUNAS = ('timestamp', 'admin_username', 'action', 'target_username', 'target_cargo',
+           'alvo_tipo', 'alvo_id', 'details')
+
+_buffer = deque()
+_evento = threading.Event()
+_lock = threading.Lock()
+_thread = None
+_pid = None
+_parar = False
+_ultima_rotacao = 0.0
+_metricas = {'registrados': 0, 'gravados': 0, 'lotes': 0, 'descartados': 0, 'falhas': 0,
+             'ultimo_lote_ms': 0.0}
+
+
+def registrar(action, admin_username, target_username='', target_cargo='',
+              alvo_tipo=None, alvo_id=None, details=None):
+    """Enfileira um evento de auditoria; a gravação acontece em segundo plano"""
+    if len(_buffer) >= AUDITORIA_BUFFER_MAX:
+        _metricas['descartados'] += 1
+        return
+    _buffer.append((
+        datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        admin_username or 'Sistema', action, target_username or '', target_cargo or '',
+        alvo_tipo, alvo_id,
+        details if details is None or isinstance(details, str) else json.dumps(details, ensure_ascii=False),
+    ))
+    _metricas['registrados'] += 1
+    if _thread is None or _pid != os.getpid():
+        _iniciar()
+    if len(_buffer) >= AUDITORIA_LOTE:
+        _evento.set()
+
+
+def _inserir_lote(cursor, eventos):
+    cursor.executemany(f'''
+        INSERT INTO AuditLog ({', '.join(COLUNAS)})
+        VALUES ({', '.join('?' * len(COLUNAS))})
+    ''', eventos)
+
+
+def descarregar():
+    """Grava imediatamente os eventos pendentes; retorna quantos foram gravados"""
+    gravados = 0
+    while _buffer:
+        eventos = []
+        while _buffer and len(eventos) < AUDITORIA_LOTE:
+            eventos.append(_buffer.popleft())
+        inicio = time.perf_counter()
+        try:
+            escrita.executar(_inserir_lote, eventos)
+        except Exception as e:
+            # Devolve ao buffer para a próxima tentativa
+            _buffer.extendleft(reversed(eventos))
+            _metricas['falhas'] += 1
+            print(f"Erro ao gravar auditoria: {e}")
+            break
+        gravados += len(eventos)
+        with _lock:
+            _metricas['gravados'] += len(eventos)
+            _metricas['lotes'] += 1
+            _metricas['ultimo_lote_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return gravados
+
+
+def _laco():
+    global _ultima_rotacao
+    while not _parar:
+        _evento.wait(AUDITORIA_INTERVALO)
+        _evento.clear()
+        descarregar()
+        # Rotação no máximo uma vez por dia em cada processo
+        if time.time() - _ultima_rotacao > 86400:
+            _ultima_rotacao = time.time()
+            try:
+                rotacionar()
+            except Exception as e:
+                print(f"Erro ao rotacionar auditoria: {e}")
+
+
+def _iniciar():
+    global _thread, _pid, _parar
+    with _lock:
+        # A thread não sobrevive ao fork dos workers do gunicorn
+        if _thread is not None and _pid == os.getpid():
+            return
+        _parar = False
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_laco, name='auditoria', daemon=True)
+        _thread.start()
+
+
+def encerrar():
+    """Para a thread e grava o que estiver no buffer"""
+    global _parar, _thread
+    if _thread is not None and _pid == os.getpid():
+        _parar = True
+        _evento.set()
+        _thread.join(5)
+        _thread = None
+    descarregar()
+
+
+atexit.register(encerrar)
+
+
+def estatisticas():
+    with _lock:
+        return dict(_metricas, pendentes=len(_buffer))
+
+
+def _rotacionar(cursor, limite):
+    cursor.execute('''
+        SELECT DISTINCT strftime('%Y%m', timestamp) FROM AuditLog WHERE timestamp < ?
+    ''', (limite,))
+    meses = [linha[0] for linha in cursor.fetchall() if linha[0]]
+    movidos = 0
+    for mes in meses:
+        tabela = f'AuditLog_{mes}'
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {tabela} AS SELECT * FROM AuditLog WHERE 0')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabela.lower()}_timestamp ON {tabela} (timestamp)')
+        cursor.execute(f'''
+            INSERT INTO {tabela} SELECT * FROM AuditLog
+            WHERE timestamp < ? AND strftime('%Y%m', timestamp) = ?
+        ''', (limite, mes))
+        movidos += cursor.rowcount
+    cursor.execute('DELETE FROM AuditLog WHERE timestamp < ?', (limite,))
+    return movidos
+
+
+def rotacionar(dias=None):
+    """Move para AuditLog_AAAAMM os eventos mais antigos que a retenção"""
+    dias = AUDITORIA_RETENCAO_DIAS if dias is None else dias
+    limite = (datetime.utcnow() - timedelta(days=dias)).strftime('%Y-%m-%d %H:%M:%S')
+    return escrita.executar(_rotacionar, limite)
+
+
+def consultar(alvo_tipo=None, alvo_id=None, target_username=None, desde=None, ate=None,
+              limite=100, arquivo=False):
+    """Eventos mais recentes primeiro, filtrados por alvo e intervalo de tempo.
+
+    Com arquivo=True inclui as tabelas AuditLog_AAAAMM."""
+    condicoes, params = [], []
+    if alvo_tipo:
+        condicoes.append('alvo_tipo = ?')
+        params.append(alvo_tipo)
+        if alvo_id is not None:
+            condicoes.append('alvo_id = ?')
+            params.append(alvo_id)
+    if target_username:
+        condicoes.append('target_username = ?')
+        params.append(target_username)
+    if desde:
+        condicoes.append('timestamp >= ?')
+        params.append(desde)
+    if ate:
+        condicoes.append('timestamp <= ?')
+        params.append(ate)
+    where = ('WHERE ' + ' AND '.join(condicoes)) if condicoes else ''
+
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        tabelas = ['AuditLog']
+        if arquivo:
+            cursor.execute('''
+                SELECT name FROM sqlite_master
+                WHERE type = 'table' AND name GLOB 'AuditLog_[0-9]*'
+                ORDER BY name DESC
+            ''')
+            tabelas += [linha[0] for linha in cursor.fetchall()]
+        consulta = ' UNION ALL '.join(
+            f'SELECT {", ".join(COLUNAS)} FROM {tabela} {where}' for tabela in tabelas)
+        cursor.execute(f'{consulta} ORDER BY timestamp DESC LIMIT ?', params * len(tabelas) + [limite])
+        return [dict(zip(COLUNAS, linha)) for linha in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def instalar(app):
+    """Registra o evento de auditoria ao fim de toda requisição que altera dados"""
+    from flask import g, request, session
+
+    @app.before_request
+    def marcar_mensagens():
+        # Só as mensagens flash criadas nesta requisição indicam o resultado
+        g.flashes_antes = len(session.get('_flashes', ()))
+
+    @app.after_request
+    def auditar(resposta):
+        endpoint = request.endpoint
+        if endpoint and request.blueprint != 'api_v1':
+            # Nas páginas a ação gravada é o nome da view, sem o blueprint
+            endpoint = endpoint.rsplit('.', 1)[-1]
+        if not endpoint or endpoint in ROTAS_IGNORADAS:
+            return resposta
+        if request.method == 'GET' and endpoint not in ROTAS_GET_MUTAVEIS:
+            return resposta
+        if request.method in ('HEAD', 'OPTIONS'):
+            return resposta
+
+        alvo_tipo = ALVOS.get(endpoint)
+        if alvo_tipo is None and endpoint.startswith('api_v1.'):
+            alvo_tipo = ALVOS_API.get(endpoint.rsplit('_', 1)[-1])
+        detalhes = {
+            'metodo': request.method,
+            'status': resposta.status_code,
+            'campos': sorted(k for k in request.form if 'password' not in k and 'senha' not in k),
+        }
+        flashes = session.get('_flashes', ())
+        if len(flashes) > g.get('flashes_antes', 0):
+            detalhes['resultado'] = flashes[-1][0]
+        detalhes.update(getattr(g, 'auditoria', {}))
+        registrar(endpoint, session.get('username'),
+                  target_username=detalhes.pop('target_username', ''),
+                  target_cargo=detalhes.pop('target_cargo', ''),
+                  alvo_tipo=alvo_tipo,
+                  alvo_id=(request.view_args or {}).get('id', detalhes.pop('alvo_id', None)),
+                  details=detalhes)
+        return resposta
+
+
+if __name__ == '__main__':
+    import sys
+    if '--rotacionar' in sys.argv:
+        print(f"{rotacionar()} evento(s) de auditoria arquivado(s).")
+    else:
+        for evento in consultar(limite=20):
+            print(evento)
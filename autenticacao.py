@@ -0,0 +1,37 @@
+"""
+Blueprint de autenticação: login e logout pela sessão do Flask
+"""
+
+from flask import Blueprint, current_app, flash, redirect, render_template, request, session, url_for
+from database import buscar_usuario, verificar_senha
+
+autenticacao = Blueprint('autenticacao', __name__)
+
+
+@autenticacao.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        user = buscar_usuario(username)
+
+        if user and verificar_senha(user, password):
+            session['username'] = username
+            session['cargo'] = user[3]  # cargo está na posição 3 da tupla
+            session['user_id'] = user[0]  # Adicionar ID do usuário à sessão
+            flash('Login efetuado com sucesso!', 'success')
+            # Um worker só de calendário não tem o painel administrativo
+            if user[3] in ('admin','cotead','colaborador') and 'usuarios' in current_app.blueprints:
+                return redirect(url_for('usuarios.admin_dashboard'))
+            return redirect(url_for('calendario.agenda'))
+        else:
+            flash('Login falhou. Verifique seu usuário e senha.', 'error')
+            return render_template('login.html', username=username)
+    return render_template('login.html')
+
+
+@autenticacao.route('/logout')
+def logout():
+    session.clear()
+    flash('Logout efetuado com sucesso!', 'success')
+    return redirect(url_for('autenticacao.login'))
@@ -6,9 +6,39 @@ Garante que os dados nunca sejam perdidos
 
 import sqlite3
 import os
+import io
+import sys
+import gzip
 import json
+import time
+import hashlib
 import datetime
-from database import conectar, DATABASE
+from database import conectar, conexao_dedicada, DATABASE
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; sem ele as exportações usam gzip
+    zstandard = None
+
+# Diretório dos backups e quantos de cada tipo são mantidos
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+BACKUP_MANTER = int(os.environ.get('BACKUP_MANTER', 7))
+# Páginas copiadas por passo do snapshot e pausa entre os passos
+BACKUP_PAGINAS = int(os.environ.get('BACKUP_PAGINAS', 256))
+BACKUP_PAUSA = float(os.environ.get('BACKUP_PAUSA', 0.005))
+# Linhas lidas por vez na exportação NDJSON
+BACKUP_LOTE = int(os.environ.get('BACKUP_LOTE', 1000))
+# Linhas gravadas por executemany no restore
+BACKUP_LOTE_RESTORE = int(os.environ.get('BACKUP_LOTE_RESTORE', 5000))
+
+# Tabelas com dados próprios; OcupacaoSala, VersaoDados e os contadores são
+# reconstruídos pelos triggers quando as reservas são restauradas
+TABELAS_EXPORTADAS = ['Users', 'Sala', 'Setor', 'Equipamentos', 'SerieReserva',
+                      'Reservas', 'ReservaEquipamento', 'AuditLog']
+# Tabelas com alterações registradas em Alteracoes (migração 11), das mães
+# para as filhas; o AuditLog só recebe inserções e é exportado pelo id
+TABELAS_RASTREADAS = TABELAS_EXPORTADAS[:-1]
+CHAVES = {'ReservaEquipamento': ('reserva_id', 'equipamento_id')}
 
 def backup_to_json():
     """Faz backup dos dados em formato JSON"""
@@ -60,39 +90,596 @@ def backup_to_json():
         return None
 
 def restore_from_json(backup_file):
-    """Restaura dados de um arquivo JSON"""
+    """Restaura dados de um backup JSON (formato antigo) ou NDJSON.
+
+    O JSON antigo é um documento único e precisa ser lido inteiro; as linhas
+    são mescladas às existentes pela mesma carga em lote do restore NDJSON.
+    Arquivos NDJSON são restaurados por restaurar() (base + incrementais)."""
     try:
+        if '.ndjson' in backup_file:
+            return restaurar(backup_file)
+
         with open(backup_file, 'r', encoding='utf-8') as f:
             backup_data = json.load(f)
 
-        conn = conectar()
+        conn = conexao_dedicada()
+        conn.isolation_level = None
         cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('PRAGMA defer_foreign_keys = ON')
+            # Como em restaurar(): sem os triggers de ocupação, reservas legadas
+            # em conflito entram e OcupacaoSala é reconstruída no fim
+            recriar, ocupacao = _suspender_indices_e_triggers(cursor)
+            carga = _Carga(cursor, upsert=True)
+            for table in TABELAS_EXPORTADAS:
+                for row in backup_data.get(table, ()):
+                    carga.adicionar({'tabela': table, 'linha': row})
+            carga.descarregar()
+            _recalcular_derivados(cursor)
+            for sql in recriar + ocupacao:
+                cursor.execute(sql)
+            cursor.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        for table, total in carga.contagem.items():
+            print(f"[OK] Restaurados {total} registros da tabela {table}")
+        print(f"[OK] Restore concluido com sucesso! ({carga.resumo()}); gere uma nova base (--ndjson)")
+        return True
 
-        # Restaurar dados de cada tabela
-        tables = ['Users', 'Sala', 'Setor', 'Equipamentos', 'Reservas']
+    except Exception as e:
+        print(f"[ERRO] Erro no restore: {e}")
+        return False
 
-        for table in tables:
-            if table in backup_data:
-                data = backup_data[table]
+class _SaidaComHash(io.RawIOBase):
+    """Arquivo de saída que calcula o sha256 e o tamanho do que é gravado"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.sha256 = hashlib.sha256()
+        self.tamanho = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.sha256.update(dados)
+        self.tamanho += len(dados)
+        return self.arquivo.write(dados)
+
+    def close(self):
+        if not self.closed:
+            self.arquivo.close()
+        super().close()
+
+
+def _sha256_arquivo(caminho):
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def _nome_backup(prefixo, extensao):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    agora = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return os.path.join(BACKUP_DIR, f'{prefixo}_{agora}{extensao}')
+
+
+def _gravar_manifesto(caminho, **dados):
+    """Manifesto ao lado do backup: arquivo, sha256, tamanho e metadados"""
+    manifesto = dict(arquivo=os.path.basename(caminho), criado_em=datetime.datetime.now().isoformat(),
+                     **dados)
+    temporario = caminho + '.manifesto.json.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho + '.manifesto.json')
+    return manifesto
+
+
+def _versao_esquema(cursor):
+    try:
+        cursor.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version')
+        return cursor.fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def backup_sqlite(destino=None, paginas=None, pausa=None):
+    """Snapshot consistente do banco com a API de backup do SQLite.
+
+    A cópia é feita em passos de BACKUP_PAGINAS páginas com uma pausa entre
+    eles. Uma transação de leitura aberta na origem fixa o snapshot do WAL:
+    as escritas do app continuam e o backup não recomeça a cada COMMIT."""
+    destino = destino or _nome_backup('snapshot', '.db')
+    paginas = paginas or BACKUP_PAGINAS
+    pausa = BACKUP_PAUSA if pausa is None else pausa
+    inicio = time.perf_counter()
+
+    origem = conexao_dedicada()
+    origem.isolation_level = None
+    copia = sqlite3.connect(destino + '.tmp')
+    try:
+        origem.execute('BEGIN')
+        versao = _versao_esquema(origem.cursor())
+        origem.backup(copia, pages=paginas, sleep=pausa)
+        origem.execute('COMMIT')
+        # O snapshot é um arquivo autônomo, sem WAL ao lado
+        copia.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        copia.close()
+        origem.close()
+    os.replace(destino + '.tmp', destino)
+
+    manifesto = _gravar_manifesto(destino, tipo='sqlite', sha256=_sha256_arquivo(destino),
+                                  bytes=os.path.getsize(destino), versao_esquema=versao)
+    print(f"[OK] Snapshot salvo em {destino} ({manifesto['bytes']} bytes, "
+          f"{time.perf_counter() - inicio:.2f}s)")
+    return destino
+
+
+def _abrir_compactado(saida, compressao):
+    if compressao == 'zstd':
+        bruto = zstandard.ZstdCompressor(level=3).stream_writer(saida, closefd=False)
+    else:
+        bruto = gzip.GzipFile(fileobj=saida, mode='wb', compresslevel=6)
+    return io.TextIOWrapper(bruto, encoding='utf-8', newline='\n')
+
+
+def _marcas(cursor):
+    """Posição atual do registro de alterações e do AuditLog.
 
-                for row in data:
-                    columns = list(row.keys())
-                    values = list(row.values())
-                    placeholders = ', '.join(['?' for _ in columns])
+    Vem de sqlite_sequence (AUTOINCREMENT): MAX() voltaria a zero depois da
+    poda de Alteracoes ou da rotação do AuditLog."""
+    cursor.execute("SELECT name, seq FROM sqlite_sequence WHERE name IN ('Alteracoes', 'AuditLog')")
+    sequencias = dict(cursor.fetchall())
+    return {'seq': sequencias.get('Alteracoes', 0), 'auditlog_id': sequencias.get('AuditLog', 0)}
 
-                    query = f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) VALUES ({placeholders})'
-                    cursor.execute(query, values)
 
-                print(f"[OK] Restaurados {len(data)} registros da tabela {table}")
+def _ler_marca():
+    caminho = os.path.join(BACKUP_DIR, 'marca.json')
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
 
+def _gravar_marca(marca):
+    """Grava a marca d'água dos incrementais e poda o registro de alterações já exportado"""
+    caminho = os.path.join(BACKUP_DIR, 'marca.json')
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(marca, f, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+    conn = conexao_dedicada()
+    try:
+        conn.execute('DELETE FROM Alteracoes WHERE seq <= ?', (marca['seq'],))
         conn.commit()
+    finally:
         conn.close()
-        print("[OK] Restore concluido com sucesso!")
-        return True
 
-    except Exception as e:
-        print(f"[ERRO] Erro no restore: {e}")
-        return False
+
+def _ativar_captura():
+    """Liga o registro de alterações (migração 12) antes do snapshot da base:
+    o que mudar durante a exportação fica depois da marca e vai no incremental"""
+    conn = conexao_dedicada()
+    try:
+        conn.execute('INSERT OR IGNORE INTO CapturaAlteracoes (id) VALUES (1)')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _linhas_json(tabela, cursor, lote, contagem):
+    colunas = [c[0] for c in cursor.description]
+    contagem.setdefault(tabela, 0)
+    while True:
+        linhas = cursor.fetchmany(lote)
+        if not linhas:
+            break
+        contagem[tabela] += len(linhas)
+        for linha in linhas:
+            yield {'tabela': tabela, 'linha': dict(zip(colunas, linha))}
+
+
+def _exportar(prefixo, compressao, gerar, **manifesto):
+    """Grava em NDJSON compactado o cabeçalho e as linhas produzidas por
+    gerar(cursor) -> (cabecalho, linhas), tudo numa única transação de leitura"""
+    if compressao == 'zstd' and zstandard is None:
+        print("[AVISO] Módulo zstandard não instalado; usando gzip")
+        compressao = 'gzip'
+    destino = _nome_backup(prefixo, '.ndjson.zst' if compressao == 'zstd' else '.ndjson.gz')
+    inicio = time.perf_counter()
+
+    conn = conexao_dedicada()
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    saida = _SaidaComHash(open(destino + '.tmp', 'wb'))
+    try:
+        cursor.execute('BEGIN')
+        cabecalho, linhas = gerar(cursor)
+        cabecalho = dict(cabecalho, versao_esquema=_versao_esquema(cursor),
+                         gerado_em=datetime.datetime.now().isoformat())
+        with _abrir_compactado(saida, compressao) as texto:
+            texto.write(json.dumps({'cabecalho': cabecalho}) + '\n')
+            texto.writelines(json.dumps(linha, ensure_ascii=False, default=str) + '\n' for linha in linhas)
+        cursor.execute('COMMIT')
+    finally:
+        saida.close()
+        conn.close()
+    os.replace(destino + '.tmp', destino)
+
+    _gravar_manifesto(destino, compressao=compressao, sha256=saida.sha256.hexdigest(),
+                      bytes=saida.tamanho, **cabecalho, **manifesto)
+    print(f"[OK] Exportação salva em {destino} ({saida.tamanho} bytes, "
+          f"{time.perf_counter() - inicio:.2f}s)")
+    return destino, cabecalho
+
+
+def exportar_ndjson(compressao='gzip', tabelas=None, lote=None):
+    """Exporta as tabelas em NDJSON compactado, lendo BACKUP_LOTE linhas por vez.
+
+    Primeira linha: cabeçalho com a versão do esquema; depois uma linha
+    {"tabela": ..., "linha": {...}} por registro. Tudo sai de uma única
+    transação de leitura, então as tabelas são consistentes entre si. A
+    exportação completa vira a base dos backups incrementais."""
+    tabelas = tabelas or TABELAS_EXPORTADAS
+    lote = lote or BACKUP_LOTE
+    completa = tabelas == TABELAS_EXPORTADAS
+    contagem = {}
+    if completa:
+        _ativar_captura()
+
+    def gerar(cursor):
+        def linhas():
+            for tabela in tabelas:
+                cursor.execute(f'SELECT * FROM {tabela}')
+                yield from _linhas_json(tabela, cursor, lote, contagem)
+        return dict(_marcas(cursor), tipo='base', tabelas=tabelas), linhas()
+
+    destino, cabecalho = _exportar('dados', compressao, gerar, linhas=contagem)
+    for tabela, total in contagem.items():
+        print(f"[OK] Exportação da tabela {tabela}: {total} registros")
+    if completa:
+        _gravar_marca({'base': os.path.basename(destino), 'seq': cabecalho['seq'],
+                       'auditlog_id': cabecalho['auditlog_id']})
+    return destino
+
+
+def exportar_incremental(compressao='gzip', lote=None):
+    """Exporta só o que mudou desde a marca d'água da última exportação.
+
+    Para cada linha alterada sai o estado atual ({"tabela", "linha"}) ou,
+    se ela não existe mais, {"tabela", "excluir": chave}. Várias alterações
+    da mesma linha viram um único registro; as exclusões vêm antes."""
+    marca = _ler_marca()
+    if marca is None:
+        raise RuntimeError('Nenhuma base encontrada; gere antes uma exportação completa (--ndjson)')
+    conn = conexao_dedicada()
+    try:
+        capturando = conn.execute('SELECT 1 FROM CapturaAlteracoes').fetchone()
+    finally:
+        conn.close()
+    if not capturando:
+        raise RuntimeError('Registro de alterações desligado; gere uma nova base (--ndjson)')
+    lote = lote or BACKUP_LOTE
+    contagem = {}
+
+    def gerar(cursor):
+        atual = _marcas(cursor)
+
+        def grupos(tabela):
+            """Chaves alteradas da tabela, em lotes, com o filtro SQL que as seleciona"""
+            chave = CHAVES.get(tabela, ('id',))
+            cursor.execute('''
+                SELECT DISTINCT chave FROM Alteracoes
+                WHERE tabela = ? AND seq > ? AND seq <= ?
+            ''', (tabela, marca['seq'], atual['seq']))
+            alteradas = [json.loads(c) for (c,) in cursor.fetchall()]
+            extrair = ', '.join(f"json_extract(value, '$[{n}]')" for n in range(len(chave)))
+            filtro = f"({', '.join(chave)}) IN (SELECT {extrair} FROM json_each(?))"
+            for i in range(0, len(alteradas), lote):
+                yield chave, filtro, alteradas[i:i + lote]
+
+        def linhas():
+            # Exclusões antes das inclusões, das tabelas filhas para as mães: uma
+            # reserva excluída e outra criada no mesmo turno não colidem no restore
+            contagem['excluidas'] = 0
+            for tabela in reversed(TABELAS_RASTREADAS):
+                for chave, filtro, grupo in grupos(tabela):
+                    cursor.execute(f"SELECT {', '.join(chave)} FROM {tabela} WHERE {filtro}",
+                                   (json.dumps(grupo),))
+                    existentes = set(cursor.fetchall())
+                    for k in grupo:
+                        if tuple(k) not in existentes:
+                            contagem['excluidas'] += 1
+                            yield {'tabela': tabela, 'excluir': dict(zip(chave, k))}
+
+            for tabela in TABELAS_RASTREADAS:
+                for chave, filtro, grupo in grupos(tabela):
+                    cursor.execute(f'SELECT * FROM {tabela} WHERE {filtro}', (json.dumps(grupo),))
+                    yield from _linhas_json(tabela, cursor, lote, contagem)
+
+            cursor.execute('SELECT * FROM AuditLog WHERE id > ? AND id <= ?',
+                           (marca['auditlog_id'], atual['auditlog_id']))
+            yield from _linhas_json('AuditLog', cursor, lote, contagem)
+
+        cabecalho = dict(atual, tipo='incremental', base=marca['base'],
+                         seq_anterior=marca['seq'], auditlog_id_anterior=marca['auditlog_id'])
+        return cabecalho, linhas()
+
+    destino, cabecalho = _exportar('incremental', compressao, gerar, linhas=contagem)
+    print(f"[OK] Incremental desde a alteração {marca['seq']}: {contagem}")
+    _gravar_marca(dict(marca, seq=cabecalho['seq'], auditlog_id=cabecalho['auditlog_id']))
+    return destino
+
+
+def _ler_ndjson(caminho):
+    abrir = gzip.open
+    if caminho.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('Módulo zstandard não instalado')
+        def abrir(caminho, modo):
+            return zstandard.open(caminho, modo)
+    with abrir(caminho, 'rt') as f:
+        for linha in f:
+            yield json.loads(linha)
+
+
+def _manifesto(caminho):
+    with open(caminho + '.manifesto.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def incrementos_da_base(base):
+    """Incrementais gerados a partir da base, na ordem em que devem ser aplicados"""
+    diretorio = os.path.dirname(base) or '.'
+    incrementos = []
+    for nome in os.listdir(diretorio):
+        if nome.startswith('incremental_') and not nome.endswith(('.manifesto.json', '.tmp')):
+            caminho = os.path.join(diretorio, nome)
+            manifesto = _manifesto(caminho)
+            if manifesto.get('base') == os.path.basename(base):
+                incrementos.append((manifesto['seq_anterior'], caminho))
+    return [caminho for _, caminho in sorted(incrementos)]
+
+
+class _Carga:
+    """Carga em lote: registros consecutivos da mesma tabela e do mesmo
+    conjunto de colunas são gravados juntos com executemany, BACKUP_LOTE_RESTORE
+    por vez. Sem upsert, a tabela tem de estar vazia (carga da base)."""
+
+    def __init__(self, cursor, upsert=False, lote=None):
+        self.cursor = cursor
+        self.upsert = upsert
+        self.lote = lote or BACKUP_LOTE_RESTORE
+        self.grupo = None
+        self.valores = []
+        self.contagem = {}
+        self.inicio = time.perf_counter()
+
+    def adicionar(self, registro):
+        if 'excluir' in registro:
+            dados, tipo = registro['excluir'], 'excluir'
+        else:
+            dados, tipo = registro['linha'], 'linha'
+        grupo = (tipo, registro['tabela'], tuple(dados))
+        if grupo != self.grupo:
+            self.descarregar()
+            self.grupo = grupo
+        self.valores.append(tuple(dados.values()))
+        if len(self.valores) >= self.lote:
+            self.descarregar()
+
+    def _sql(self):
+        tipo, tabela, colunas = self.grupo
+        if tipo == 'excluir':
+            return f"DELETE FROM {tabela} WHERE {' AND '.join(f'{c} = ?' for c in colunas)}"
+        sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+        if self.upsert:
+            # UPSERT em vez de REPLACE: a linha é atualizada no lugar, sem ser apagada
+            chave = CHAVES.get(tabela, ('id',))
+            atualizar = ', '.join(f'{c} = excluded.{c}' for c in colunas if c not in chave)
+            sql += f" ON CONFLICT ({', '.join(chave)}) DO {'UPDATE SET ' + atualizar if atualizar else 'NOTHING'}"
+        return sql
+
+    def descarregar(self):
+        if not self.valores:
+            return
+        self.cursor.executemany(self._sql(), self.valores)
+        tabela = self.grupo[1]
+        self.contagem[tabela] = self.contagem.get(tabela, 0) + len(self.valores)
+        self.valores = []
+
+    def resumo(self):
+        total = sum(self.contagem.values())
+        segundos = time.perf_counter() - self.inicio
+        return f"{total} registros em {segundos:.2f}s, {total / max(segundos, 1e-9):.0f} registros/s"
+
+
+def _suspender_indices_e_triggers(cursor):
+    """Remove, dentro da transação do restore, os índices secundários das
+    tabelas restauradas e os triggers de contabilidade (versão, contador,
+    alterações) e de ocupação, cujo efeito é recalculado no fim. Retorna o
+    SQL para recriá-los: (índices e contabilidade, ocupação)."""
+    tabelas = ', '.join(f"'{t}'" for t in TABELAS_EXPORTADAS)
+    cursor.execute(f'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND (
+            (type = 'index' AND tbl_name IN ({tabelas}))
+            OR (type = 'trigger' AND (name GLOB 'trg_*_versao_*' OR name GLOB 'trg_*_contador_*'
+                                      OR name GLOB 'trg_*_alteracoes_*' OR name GLOB 'trg_*_ocupacao_*'))
+        )
+    ''')
+    objetos = cursor.fetchall()
+    for tipo, nome, _ in objetos:
+        cursor.execute(f'DROP {tipo.upper()} {nome}')
+    ocupacao = [sql for _, nome, sql in objetos if '_ocupacao_' in nome]
+    return [sql for _, nome, sql in objetos if '_ocupacao_' not in nome], ocupacao
+
+
+def _recalcular_derivados(cursor):
+    """Ocupação das salas, contadores e versões dos dados depois de uma carga"""
+    # Como na migração 2: reservas legadas em conflito, que o esquema aceita,
+    # deixam o turno com a primeira delas em vez de abortar o restore
+    cursor.execute('DELETE FROM OcupacaoSala')
+    cursor.execute('''
+        INSERT OR IGNORE INTO OcupacaoSala (sala_id, data, turno, reserva_id)
+            SELECT r.sala_id, r.data, pt.turno, r.id
+            FROM Reservas r
+            JOIN PeriodoTurno pt ON pt.periodo = r.periodo
+            ORDER BY r.id
+    ''')
+    # Os triggers somaram as reservas restauradas ao contador que veio no backup
+    cursor.execute('''
+        UPDATE Users SET num_reservas = (
+            SELECT COUNT(*) FROM Reservas r WHERE r.user_id = Users.id
+        )
+    ''')
+    # Invalida ETags e caches de todas as tabelas de uma vez
+    cursor.execute('UPDATE VersaoDados SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP')
+    _invalidar_marca(cursor)
+
+
+def _invalidar_marca(cursor):
+    """Descarta o registro de alterações e a marca d'água: o que foi restaurado
+    não é alteração a exportar, e a próxima exportação tem de ser completa.
+
+    A marca sai antes do COMMIT: se o restore falhar, o pior caso é pedir
+    uma base nova, nunca um incremental que pula alterações."""
+    cursor.execute('DELETE FROM Alteracoes')
+    # Sem base, nada é registrado até a próxima exportação completa
+    cursor.execute('DELETE FROM CapturaAlteracoes')
+    marca = os.path.join(BACKUP_DIR, 'marca.json')
+    if os.path.exists(marca):
+        os.remove(marca)
+
+
+def _exclusoes_primeiro(caminho):
+    """Registros do incremental com as exclusões antes das linhas atuais (os
+    gerados antes dessa ordem trazem as exclusões no fim); lê o arquivo duas vezes"""
+    for excluir in (True, False):
+        for registro in _ler_ndjson(caminho):
+            if 'cabecalho' not in registro and ('excluir' in registro) == excluir:
+                yield registro
+
+
+def restaurar(base, incrementos=None, lote=None):
+    """Restaura a base NDJSON e aplica os incrementais em ordem, numa única transação.
+
+    O arquivo é lido em streaming e gravado em lotes (_Carga), com as chaves
+    estrangeiras adiadas até o COMMIT e os índices secundários recriados
+    depois da base. Os triggers de ocupação ficam suspensos durante a carga e
+    OcupacaoSala é reconstruída no fim. Sem a lista de incrementais, usa todos os gerados a
+    partir da base."""
+    if incrementos is None:
+        incrementos = incrementos_da_base(base)
+    for caminho in [base] + incrementos:
+        if not verificar_backup(caminho):
+            raise RuntimeError(f'{caminho} não confere com o manifesto')
+    # A cadeia tem de ser contínua: cada incremental começa onde o anterior parou
+    seq = _manifesto(base)['seq']
+    for caminho in incrementos:
+        manifesto = _manifesto(caminho)
+        if manifesto['seq_anterior'] != seq:
+            raise RuntimeError(f'{caminho} não continua a cadeia (esperado a partir de {seq})')
+        seq = manifesto['seq']
+
+    conn = conexao_dedicada()
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('PRAGMA defer_foreign_keys = ON')
+        recriar, ocupacao = _suspender_indices_e_triggers(cursor)
+        for tabela in reversed(TABELAS_EXPORTADAS):
+            cursor.execute(f'DELETE FROM {tabela}')
+
+        for n, caminho in enumerate([base] + incrementos):
+            cabecalho = next(_ler_ndjson(caminho))['cabecalho']
+            if cabecalho['versao_esquema'] != _versao_esquema(cursor):
+                print(f"[AVISO] {caminho} foi gerado na versão de esquema {cabecalho['versao_esquema']}")
+            # A base entra em tabelas vazias; os incrementais substituem linhas,
+            # com as exclusões de cada um aplicadas antes
+            carga = _Carga(cursor, upsert=n > 0, lote=lote)
+            for registro in _ler_ndjson(caminho) if n == 0 else _exclusoes_primeiro(caminho):
+                if 'cabecalho' not in registro:
+                    carga.adicionar(registro)
+            carga.descarregar()
+            print(f"[OK] {caminho}: {carga.resumo()}")
+            if n == 0:
+                etapa = time.perf_counter()
+                for sql in recriar:
+                    cursor.execute(sql)
+                print(f"[OK] {len(recriar)} índices e triggers recriados em {time.perf_counter() - etapa:.2f}s")
+
+        _recalcular_derivados(cursor)
+        for sql in ocupacao:
+            cursor.execute(sql)
+        etapa = time.perf_counter()
+        cursor.execute('COMMIT')
+        print(f"[OK] COMMIT (com checagem das chaves estrangeiras) em {time.perf_counter() - etapa:.2f}s")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    print(f"[OK] Restore concluido em {time.perf_counter() - inicio:.2f}s; gere uma nova base (--ndjson)")
+    return True
+
+
+def verificar_backup(caminho):
+    """Confere o arquivo contra o sha256 e o tamanho do manifesto"""
+    with open(caminho + '.manifesto.json', encoding='utf-8') as f:
+        manifesto = json.load(f)
+    ok = (os.path.getsize(caminho) == manifesto['bytes']
+          and _sha256_arquivo(caminho) == manifesto['sha256'])
+    print(f"[{'OK' if ok else 'ERRO'}] {caminho}: "
+          f"{'íntegro' if ok else 'não confere com o manifesto'}")
+    return ok
+
+
+def rotacionar_backups(manter=None, diretorio=None):
+    """Mantém os `manter` backups mais recentes de cada tipo; retorna os removidos.
+
+    Incrementais não contam no limite: saem junto com a base de que dependem."""
+    manter = BACKUP_MANTER if manter is None else manter
+    diretorio = diretorio or BACKUP_DIR
+    if not os.path.isdir(diretorio):
+        return []
+    por_tipo = {}
+    for nome in os.listdir(diretorio):
+        if nome.endswith(('.manifesto.json', '.tmp')) or nome == 'marca.json':
+            continue
+        por_tipo.setdefault(nome.split('_', 1)[0], []).append(nome)
+    incrementais = por_tipo.pop('incremental', [])
+
+    def remover(nome):
+        for caminho in (os.path.join(diretorio, nome),
+                        os.path.join(diretorio, nome + '.manifesto.json')):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        removidos.append(nome)
+
+    removidos = []
+    for nomes in por_tipo.values():
+        # O nome carrega a data, então a ordem alfabética é a cronológica
+        for nome in sorted(nomes)[:-manter] if manter else nomes:
+            remover(nome)
+    for nome in incrementais:
+        if not os.path.exists(os.path.join(diretorio, _manifesto(os.path.join(diretorio, nome))['base'])):
+            remover(nome)
+    return removidos
+
 
 def check_data_integrity():
     """Verifica integridade dos dados"""
@@ -133,13 +720,53 @@ def check_data_integrity():
         return None
 
 if __name__ == "__main__":
+    # Uso: python backup_data.py [--sqlite] [--ndjson] [--zstd] [--json]
+    #      python backup_data.py --incremental [--zstd]
+    #      python backup_data.py --verificar ARQUIVO
+    #      python backup_data.py --restaurar BASE [INCREMENTAL ...]
+    if '--verificar' in sys.argv:
+        sys.exit(0 if verificar_backup(sys.argv[sys.argv.index('--verificar') + 1]) else 1)
+
+    if '--restaurar' in sys.argv:
+        arquivos = sys.argv[sys.argv.index('--restaurar') + 1:]
+        try:
+            restaurar(arquivos[0], arquivos[1:] or None)
+        except Exception as e:
+            print(f"[ERRO] Erro no restore: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    if '--incremental' in sys.argv:
+        try:
+            exportar_incremental(compressao='zstd' if '--zstd' in sys.argv else 'gzip')
+        except Exception as e:
+            print(f"[ERRO] Falha no backup incremental: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
     print("[INFO] Verificando integridade dos dados...")
     check_data_integrity()
 
-    print("\n[INFO] Fazendo backup dos dados...")
-    backup_file = backup_to_json()
-
-    if backup_file:
-        print(f"\n[OK] Backup concluido: {backup_file}")
-    else:
-        print("\n[ERRO] Falha no backup!")
\ No newline at end of file
+    if '--json' in sys.argv:
+        # Formato antigo: a base inteira em memória, para bancos pequenos
+        print("\n[INFO] Fazendo backup dos dados...")
+        backup_file = backup_to_json()
+        if backup_file:
+            print(f"\n[OK] Backup concluido: {backup_file}")
+        else:
+            print("\n[ERRO] Falha no backup!")
+        sys.exit(0 if backup_file else 1)
+
+    modos = [m for m in ('--sqlite', '--ndjson') if m in sys.argv] or ['--sqlite', '--ndjson']
+    try:
+        if '--sqlite' in modos:
+            print("\n[INFO] Gerando snapshot do banco...")
+            backup_sqlite()
+        if '--ndjson' in modos:
+            print("\n[INFO] Exportando dados em NDJSON...")
+            exportar_ndjson(compressao='zstd' if '--zstd' in sys.argv else 'gzip')
+    except Exception as e:
+        print(f"\n[ERRO] Falha no backup: {e}")
+        sys.exit(1)
+    for nome in rotacionar_backups():
+        print(f"[INFO] Backup antigo removido: {nome}")
\ No newline at end of file
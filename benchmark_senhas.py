@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark de verificação de senhas
+Mede logins/segundo para diferentes custos de hash e níveis de concorrência
+
+Uso: python benchmark_senhas.py [segundos_por_cenario]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import senhas
+
+METODOS = [
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+]
+CONCORRENCIAS = [1, 2, 4]
+
+
+def medir(metodo, concorrencia, duracao):
+    password_hash = senhas.gerar_hash('senha-de-teste', metodo)
+    fim = time.perf_counter() + duracao
+
+    def cliente():
+        logins = 0
+        while time.perf_counter() < fim:
+            confere, _ = senhas.verificar(password_hash, 'senha-de-teste', metodo)
+            assert confere
+            logins += 1
+        return logins
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        total = sum(pool.map(lambda _: cliente(), range(concorrencia)))
+    return total / (time.perf_counter() - inicio)
+
+
+if __name__ == '__main__':
+    duracao = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    print(f"[INFO] Processos de verificação: {senhas.SENHA_PROCESSOS}, "
+          f"concorrência máxima: {senhas.SENHA_CONCORRENCIA}")
+    print(f"{'método':<24} {'clientes':>8} {'logins/s':>10}")
+    try:
+        for metodo in METODOS:
+            for concorrencia in CONCORRENCIAS:
+                taxa = medir(metodo, concorrencia, duracao)
+                print(f"{metodo:<24} {concorrencia:>8} {taxa:>10.1f}")
+    finally:
+        senhas.encerrar()
@@ -0,0 +1,167 @@
+"""
+Blueprint do calendário: página da agenda e feed JSON do FullCalendar.
+
+Só lê o banco; é o único blueprint de páginas (além do login) de um worker
+somente leitura (APP_MODULOS=autenticacao,calendario).
+"""
+
+import os
+import sqlite3
+from flask import Blueprint, current_app, jsonify, render_template, request
+from cache import CacheLRU
+from database import conectar, estado_dados
+from permissoes import requer_cargo
+from respostas import data_parametro, responder_com_etag
+
+calendario = Blueprint('calendario', __name__)
+
+# Cache do feed do calendário (JSON já serializado), por processo
+TABELAS_CALENDARIO = ('Reservas', 'Sala', 'Setor', 'Users')
+cache_calendario = CacheLRU(
+    max_itens=int(os.environ.get('CACHE_CALENDARIO_ITENS', 256)),
+    max_bytes=int(os.environ.get('CACHE_CALENDARIO_BYTES', 8 * 1024 * 1024)))
+
+
+@calendario.route('/agenda')
+@requer_cargo(['admin', 'cotead', 'colaborador'])
+def agenda():
+    return render_template('agenda.html')
+
+
+@calendario.route('/get_reservas')
+@requer_cargo(['admin', 'cotead', 'colaborador'])
+def get_reservas():
+    # O FullCalendar envia start/end (end exclusivo) da janela visível
+    try:
+        inicio = data_parametro('start')
+        fim = data_parametro('end')
+        sala_id = request.args.get('sala_id', type=int)
+        setor_id = request.args.get('setor_id', type=int)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros start/end devem estar no formato AAAA-MM-DD'}), 400
+
+    filtros = []
+    params = []
+    if inicio:
+        filtros.append('r.data >= ?')
+        params.append(inicio)
+    if fim:
+        filtros.append('r.data < ?')
+        params.append(fim)
+    if sala_id is not None:
+        filtros.append('r.sala_id = ?')
+        params.append(sala_id)
+    if setor_id is not None:
+        filtros.append('r.setor_id = ?')
+        params.append(setor_id)
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ''
+
+    return responder_com_etag(
+        TABELAS_CALENDARIO,
+        lambda versoes: _feed_calendario(versoes, where, params, (inicio, fim, sala_id, setor_id)),
+        inicio, fim, sala_id, setor_id)
+
+
+def _eventos_json_python(cursor, where, params):
+    cursor.execute(f'''
+        SELECT r.id, r.nome, r.data, r.periodo, s.nome as sala_nome, se.nome as setor_id, r.matricula, u.username
+        FROM Reservas r
+        JOIN Sala s ON r.sala_id = s.id
+        JOIN Setor se ON r.setor_id = se.id
+        JOIN Users u ON r.user_id = u.id
+        {where}
+        ORDER BY r.data
+    ''', params)
+    reservas = cursor.fetchall()
+
+    eventos = []
+    for reserva in reservas:
+        data = reserva[2]
+        periodo = reserva[3]
+
+        if periodo == 'matutino':
+            start_time = '08:00'
+            end_time = '12:00'
+        elif periodo == 'vespertino':
+            start_time = '13:00'
+            end_time = '17:00'
+        else:  # integral
+            start_time = '08:00'
+            end_time = '17:00'
+
+        eventos.append({
+            'id': reserva[0],
+            'title': reserva[1] + ' - ' + reserva[4] + ' - ' + reserva[5],
+            'start': f"{data}T{start_time}",
+            'end': f"{data}T{end_time}",
+            'extendedProps': {
+                'sala': reserva[4],
+                'setor': reserva[5],
+                'matricula': reserva[6],
+                'usuario_logado': reserva[7]
+            }
+        })
+
+    return current_app.json.dumps(eventos).encode('utf-8')
+
+
+def _eventos_json_sql(cursor, where, params):
+    """Monta o array de eventos inteiro no SQLite (json_object/json_group_array)"""
+    cursor.execute(f'''
+        SELECT json_group_array(json(evento)) FROM (
+            SELECT json_object(
+                'id', r.id,
+                'title', r.nome || ' - ' || s.nome || ' - ' || se.nome,
+                'start', r.data || 'T' || ph.inicio,
+                'end', r.data || 'T' || ph.fim,
+                'extendedProps', json_object(
+                    'sala', s.nome,
+                    'setor', se.nome,
+                    'matricula', r.matricula,
+                    'usuario_logado', u.username
+                )
+            ) AS evento
+            FROM Reservas r
+            JOIN Sala s ON r.sala_id = s.id
+            JOIN Setor se ON r.setor_id = se.id
+            JOIN Users u ON r.user_id = u.id
+            JOIN PeriodoHorario ph ON ph.periodo = r.periodo
+            {where}
+            ORDER BY r.data
+        )
+    ''', params)
+    return cursor.fetchone()[0].encode('utf-8')
+
+
+def _feed_calendario(versoes, where, params, janela):
+    app = current_app
+    try:
+        # A chave inclui a versão dos dados: qualquer escrita em Reservas (ou
+        # nos nomes de salas, setores e usuários) torna as entradas antigas inalcançáveis
+        if versoes is None:
+            versoes = estado_dados(*TABELAS_CALENDARIO)[0]
+        chave = (versoes,) + janela
+        corpo = cache_calendario.obter(chave)
+        if corpo is not None:
+            return app.response_class(corpo, mimetype='application/json')
+
+        conn = conectar()
+        cursor = conn.cursor()
+        corpo = None
+        if app.config['CALENDARIO_JSON_SQL']:
+            try:
+                corpo = _eventos_json_sql(cursor, where, params)
+            except sqlite3.OperationalError as e:
+                # SQLite compilado sem a extensão JSON1
+                if 'no such function' not in str(e):
+                    raise
+                app.config['CALENDARIO_JSON_SQL'] = False
+        if corpo is None:
+            corpo = _eventos_json_python(cursor, where, params)
+        cache_calendario.guardar(chave, corpo)
+        return app.response_class(corpo, mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'conn' in locals():
+            conn.close()
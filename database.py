@@ -1,54 +1,255 @@
 import sqlite3
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import senhas
 from datetime import datetime
 
 # Configuração do banco de dados para produção
 def get_database_path():
+    """Caminho do banco, resolvido uma única vez e sem abrir conexões de teste"""
+    if os.environ.get('DATABASE_PATH'):
+        return os.environ['DATABASE_PATH']
     if os.environ.get('RENDER'):
-        # Tentar diferentes caminhos possíveis no Render
+        # Diferentes caminhos possíveis no Render: o primeiro em que o banco já
+        # existe ou em que o diretório aceita escrita
         possible_paths = [
             '/opt/render/project/src/salas.db',
             '/tmp/salas.db',
             './salas.db',
-            'salas.db'
         ]
-
         for path in possible_paths:
-            try:
-                # Criar diretório se necessário
-                dir_path = os.path.dirname(path)
-                if dir_path and not os.path.exists(dir_path):
-                    os.makedirs(dir_path, exist_ok=True)
-
-                # Testar se podemos escrever no local
-                test_conn = sqlite3.connect(path)
-                test_conn.close()
+            dir_path = os.path.dirname(path) or '.'
+            if os.access(path, os.W_OK) or (not os.path.exists(path) and os.access(dir_path, os.W_OK)):
                 return path
-            except:
-                continue
 
-        # Fallback para diretório atual
-        return 'salas.db'
-    else:
-        return 'salas.db'
+    return 'salas.db'
 
+_inicio = time.perf_counter()
 DATABASE = get_database_path()
+# Tempos (ms) de cada fase da inicialização; ver inicializar_banco()
+RELATORIO_INICIO = {'caminho': round((time.perf_counter() - _inicio) * 1000, 2)}
 
-def conectar():
+# Pool de conexões: cada conexão é aberta e configurada uma única vez e
+# reaproveitada entre requisições, mantendo o cache de páginas aquecido.
+# Uma conexão emprestada pertence a uma única thread até voltar ao pool; o
+# gunicorn.conf.py dimensiona o pool pelo número de threads do worker.
+POOL_TAMANHO = int(os.environ.get('DB_POOL_TAMANHO', 4))
+POOL_ESPERA = float(os.environ.get('DB_POOL_ESPERA', 5.0))
+# Worker somente leitura (ex.: só o calendário): as conexões recusam escritas
+SOMENTE_LEITURA = os.environ.get('DB_SOMENTE_LEITURA') == '1'
+# Conexões medidas por perfil_sql.py (tempo, linhas e plano das consultas lentas)
+SQL_PERFIL = os.environ.get('SQL_PERFIL') == '1'
+# Banco semente copiado para DATABASE antes da primeira conexão, quando ele
+# ainda não existe (serverless: só /tmp aceita escrita, e a cópia sobrevive
+# às invocações seguintes da mesma instância)
+DATABASE_SEMENTE = os.environ.get('DATABASE_SEMENTE')
+_semente_lock = threading.Lock()
+_semente_verificada = not DATABASE_SEMENTE
+
+
+def _copiar_semente():
+    global _semente_verificada
+    with _semente_lock:
+        if _semente_verificada:
+            return
+        if not os.path.exists(DATABASE) and os.path.exists(DATABASE_SEMENTE):
+            inicio = time.perf_counter()
+            # Cópia atômica: outro processo da instância nunca vê o arquivo pela metade
+            temporario = f'{DATABASE}.{os.getpid()}.tmp'
+            shutil.copyfile(DATABASE_SEMENTE, temporario)
+            os.replace(temporario, DATABASE)
+            RELATORIO_INICIO['semente'] = round((time.perf_counter() - inicio) * 1000, 2)
+        _semente_verificada = True
+
+
+def _abrir_conexao():
+    # Sem fallback para ':memory:': a conexão fica no pool, e um banco vazio
+    # atenderia o worker até ele ser reciclado. O erro vai para quem pediu a conexão.
+    conn = None
     try:
-        conn = sqlite3.connect(DATABASE, timeout=30.0)
+        if not _semente_verificada:
+            _copiar_semente()
+        if SQL_PERFIL:
+            from perfil_sql import ConexaoPerfilada as fabrica
+        else:
+            fabrica = sqlite3.Connection
+        conn = sqlite3.connect(DATABASE, timeout=30.0, check_same_thread=False, factory=fabrica)
         conn.execute('PRAGMA foreign_keys = ON')
         conn.execute('PRAGMA journal_mode = WAL')  # Melhor para concorrência
         conn.execute('PRAGMA synchronous = NORMAL')  # Melhor performance
         conn.execute('PRAGMA cache_size = 10000')  # Cache maior
         conn.execute('PRAGMA temp_store = MEMORY')  # Usar memória para temp
+        if SOMENTE_LEITURA:
+            conn.execute('PRAGMA query_only = ON')
         return conn
     except Exception as e:
         print(f"Erro ao conectar com banco: {e}")
-        # Fallback para memória em caso de erro crítico
-        conn = sqlite3.connect(':memory:')
-        return conn
+        if conn is not None:
+            conn.close()
+        raise
+
+
+class ConexaoPool:
+    """Conexão emprestada do pool; close() devolve a conexão ao pool"""
+
+    def __init__(self, pool, conn, avulsa=False):
+        self._pool = pool
+        self._conn = conn
+        # Aberta com o pool esgotado: não conta em _abertas
+        self._avulsa = avulsa
+
+    def __getattr__(self, nome):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(self._conn, nome)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.devolver(conn, self._avulsa)
+
+    def __del__(self):
+        # Conexões esquecidas abertas voltam ao pool em vez de vazar
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PoolConexoes:
+    """Pool de conexões SQLite por processo, seguro entre threads"""
+
+    def __init__(self, tamanho=POOL_TAMANHO, espera=POOL_ESPERA):
+        self.tamanho = tamanho
+        self.espera = espera
+        self._cond = threading.Condition()
+        self._resetar_estado()
+
+    def _resetar_estado(self):
+        self._pid = os.getpid()
+        self._livres = []
+        self._abertas = 0
+        self.estatisticas = {'checkouts': 0, 'esperas': 0, 'espera_ms': 0.0, 'aberturas': 0, 'excedentes': 0}
+
+    def _verificar_fork(self):
+        # Conexões SQLite não podem atravessar um fork (preload_app=True no
+        # gunicorn): o processo filho descarta as herdadas sem fechá-las.
+        if self._pid != os.getpid():
+            _conexoes_herdadas.extend(self._livres)
+            self._resetar_estado()
+
+    def obter(self):
+        with self._cond:
+            self._verificar_fork()
+            self.estatisticas['checkouts'] += 1
+            if not self._livres and self._abertas >= self.tamanho:
+                self.estatisticas['esperas'] += 1
+                inicio = time.perf_counter()
+                self._cond.wait_for(lambda: self._livres, timeout=self.espera)
+                self.estatisticas['espera_ms'] += (time.perf_counter() - inicio) * 1000
+            if self._livres:
+                return ConexaoPool(self, self._livres.pop())
+            if self._abertas < self.tamanho:
+                self._abertas += 1
+                self.estatisticas['aberturas'] += 1
+                try:
+                    return ConexaoPool(self, _abrir_conexao())
+                except Exception:
+                    # A vaga volta ao pool: a próxima requisição tenta abrir de novo
+                    self._abertas -= 1
+                    raise
+            # Pool esgotado após a espera: conexão avulsa, fechada na devolução
+            self.estatisticas['excedentes'] += 1
+            self.estatisticas['aberturas'] += 1
+        return ConexaoPool(self, _abrir_conexao(), avulsa=True)
+
+    def devolver(self, conn, avulsa=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            if avulsa:
+                conn.close()
+                return
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                # Só as conexões contadas em _abertas liberam uma vaga
+                conn.close()
+                self._abertas -= 1
+                self._cond.notify()
+                return
+            if len(self._livres) + 1 > self._abertas:
+                conn.close()
+                return
+            self._livres.append(conn)
+            self._cond.notify()
+
+    def fechar(self):
+        with self._cond:
+            self._verificar_fork()
+            for conn in self._livres:
+                conn.close()
+            self._abertas -= len(self._livres)
+            self._livres = []
+
+    def apos_fork(self):
+        with self._cond:
+            self._pid = None
+            self._verificar_fork()
+
+    def resumo(self):
+        with self._cond:
+            return dict(self.estatisticas, espera_ms=round(self.estatisticas['espera_ms'], 1),
+                        abertas=self._abertas, livres=len(self._livres),
+                        em_uso=self._abertas - len(self._livres), tamanho=self.tamanho)
+
+
+_conexoes_herdadas = []
+_pool = PoolConexoes()
+
+
+def conectar():
+    return _pool.obter()
+
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão do pool dentro de um bloco with"""
+    conn = conectar()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def resetar_pool():
+    """Descarta o estado do pool herdado do processo pai (usar após o fork)"""
+    _pool.apos_fork()
+
+
+def fechar_pool():
+    """Fecha as conexões ociosas do pool (usar antes do fork ou ao encerrar)"""
+    _pool.fechar()
+
+
+def definir_somente_leitura(ativo=True):
+    """Abre as próximas conexões com PRAGMA query_only; descarta as ociosas"""
+    global SOMENTE_LEITURA
+    SOMENTE_LEITURA = ativo
+    _pool.fechar()
+
+
+def estatisticas_pool():
+    return _pool.resumo()
+
+
+def conexao_dedicada():
+    """Conexão fora do pool, de uso exclusivo de quem a abriu (ex.: thread de escrita)"""
+    return _abrir_conexao()
 
 def criar_tabelas():
     conn = conectar()
@@ -103,7 +304,7 @@ def criar_tabelas():
             data DATE NOT NULL,
             periodo TEXT NOT NULL CHECK(periodo IN ('matutino', 'vespertino', 'integral')),
             equipamentos TEXT,
-            user_id INTERGER NOT NULL,
+            user_id INTEGER NOT NULL,
             FOREIGN KEY (sala_id) REFERENCES Sala(id) ON DELETE CASCADE,
             FOREIGN KEY (setor_id) REFERENCES Setor(id) ON DELETE CASCADE,
             FOREIGN KEY (user_id) REFERENCES Users(id) ON DELETE CASCADE
@@ -147,26 +348,242 @@ def criar_tabelas():
     conn.commit()
     conn.close()
 
-def adicionar_usuario(username, password, cargo):
+    # Índices e evoluções do esquema ficam nas migrações versionadas
+    from migracoes import aplicar_migracoes
+    aplicar_migracoes()
+
+def inicializar_banco(forcar=False):
+    """Prepara o banco na inicialização do processo.
+
+    Caminho rápido: uma consulta a PRAGMA user_version, que guarda a
+    assinatura do esquema (migracoes.assinatura_esquema). Só quando ela
+    difere rodam o DDL, as migrações e as sementes (usuário admin). Os tempos
+    de cada fase ficam em RELATORIO_INICIO."""
+    from migracoes import assinatura_esquema
+    relatorio = RELATORIO_INICIO
+    try:
+        inicio = time.perf_counter()
+        conn = conectar()
+        relatorio['conexao'] = round((time.perf_counter() - inicio) * 1000, 2)
+        try:
+            etapa = time.perf_counter()
+            assinatura = assinatura_esquema()
+            atual = conn.execute('PRAGMA user_version').fetchone()[0]
+            relatorio['verificacao'] = round((time.perf_counter() - etapa) * 1000, 2)
+            relatorio['caminho_rapido'] = atual == assinatura and not forcar
+
+            if not relatorio['caminho_rapido']:
+                etapa = time.perf_counter()
+                criar_tabelas()
+                relatorio['ddl'] = round((time.perf_counter() - etapa) * 1000, 2)
+
+                etapa = time.perf_counter()
+                if not buscar_usuario('admin@ses'):
+                    adicionar_usuario('admin@ses', 'SES@admin2024', 'admin')
+                    print('Usuário admin padrão criado.')
+                relatorio['sementes'] = round((time.perf_counter() - etapa) * 1000, 2)
+
+                # Gravada só depois de tudo: uma falha no meio repete o caminho completo
+                conn.execute(f'PRAGMA user_version = {assinatura}')
+        finally:
+            conn.close()
+        relatorio['total'] = round((time.perf_counter() - inicio) * 1000 + relatorio['caminho'], 2)
+        print('[INICIO] ' + ', '.join(f'{fase} {valor}' for fase, valor in relatorio.items()))
+        return True
+    except Exception as e:
+        print(f'Erro ao inicializar banco: {e}')
+        return False
+
+def estado_dados(*tabelas):
+    """Versões atuais (incrementadas por triggers) e a última alteração das tabelas"""
+    with conexao() as conn:
+        cursor = conn.execute(
+            f"SELECT tabela, versao, atualizado_em FROM VersaoDados WHERE tabela IN ({', '.join('?' * len(tabelas))})",
+            tabelas)
+        linhas = {linha[0]: linha[1:] for linha in cursor.fetchall()}
+    versoes = tuple(linhas[t][0] if t in linhas else 0 for t in tabelas)
+    datas = [linha[1] for linha in linhas.values() if linha[1]]
+    alterado_em = datetime.strptime(max(datas), '%Y-%m-%d %H:%M:%S') if datas else None
+    return versoes, alterado_em
+
+def versoes_dados(*tabelas):
+    return estado_dados(*tabelas)[0]
+
+def conflito_de_ocupacao(erro):
+    """Indica se a IntegrityError veio de um turno de sala já ocupado"""
+    return isinstance(erro, sqlite3.IntegrityError) and 'OcupacaoSala' in str(erro)
+
+def disponibilidade_equipamentos(cursor, data, periodo, ignorar_reserva=None):
+    """Estoque disponível de cada equipamento na data e período informados.
+
+    Uma única consulta agregada: soma o uso por (equipamento, turno) nas
+    reservas do dia e desconta o turno mais ocupado entre os do período.
+    Retorna linhas (id, nome, quantidade_total, disponivel)."""
+    cursor.execute('''
+        SELECT e.id, e.nome, e.quantidade, e.quantidade - COALESCE(MAX(uso.total), 0)
+        FROM Equipamentos e
+        LEFT JOIN (
+            SELECT re.equipamento_id, pt.turno, SUM(re.quantidade) AS total
+            FROM Reservas r
+            JOIN ReservaEquipamento re ON re.reserva_id = r.id
+            JOIN PeriodoTurno pt ON pt.periodo = r.periodo
+            WHERE r.data = ?
+              AND r.id IS NOT ?
+              AND pt.turno IN (SELECT turno FROM PeriodoTurno WHERE periodo = ?)
+            GROUP BY re.equipamento_id, pt.turno
+        ) uso ON uso.equipamento_id = e.id
+        GROUP BY e.id
+        ORDER BY e.nome
+    ''', (data, ignorar_reserva, periodo))
+    return cursor.fetchall()
+
+def registrar_equipamentos_reserva(cursor, reserva_id, equipamento_ids):
+    """Aplica ao livro apenas a diferença entre os equipamentos atuais e os novos.
+
+    Retorna os nomes dos equipamentos da reserva que ficaram sem estoque."""
+    novos = {int(equipamento_id) for equipamento_id in equipamento_ids}
+    cursor.execute('SELECT equipamento_id FROM ReservaEquipamento WHERE reserva_id = ?', (reserva_id,))
+    atuais = {linha[0] for linha in cursor.fetchall()}
+
+    cursor.executemany('DELETE FROM ReservaEquipamento WHERE reserva_id = ? AND equipamento_id = ?',
+                       [(reserva_id, equipamento_id) for equipamento_id in atuais - novos])
+    cursor.executemany('''
+        INSERT INTO ReservaEquipamento (reserva_id, equipamento_id, quantidade)
+        VALUES (?, ?, 1)
+    ''', [(reserva_id, equipamento_id) for equipamento_id in novos - atuais])
+
+    # Dentro da mesma transação (BEGIN IMMEDIATE) a checagem não sofre corrida
+    cursor.execute('SELECT data, periodo FROM Reservas WHERE id = ?', (reserva_id,))
+    data, periodo = cursor.fetchone()
+    return [nome for id, nome, _, disponivel in disponibilidade_equipamentos(cursor, data, periodo)
+            if id in novos and disponivel < 0]
+
+def equipamentos_da_reserva(cursor, reserva_id):
+    """Todos os equipamentos com a indicação dos que estão no livro da reserva"""
+    cursor.execute('''
+        SELECT e.id, e.nome, e.quantidade, re.reserva_id IS NOT NULL AS selecionado
+        FROM Equipamentos e
+        LEFT JOIN ReservaEquipamento re
+            ON re.equipamento_id = e.id AND re.reserva_id = ?
+        ORDER BY e.nome
+    ''', (reserva_id,))
+    return cursor.fetchall()
+
+# Unidades de escrita: executadas pela thread de escrita (escrita.executar)
+# dentro da transação já aberta; uma exceção desfaz apenas a própria unidade
+
+class EscritaRecusada(Exception):
+    """Levantada por uma unidade para desfazer o que fez e informar o motivo"""
+
+def inserir_reserva(cursor, nome, matricula, setor_id, sala_id, data, periodo, user_id, equipamento_ids=()):
+    cursor.execute('''
+        INSERT INTO Reservas (nome, matricula, setor_id, sala_id, data, periodo, user_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (nome, matricula, setor_id, sala_id, data, periodo, user_id))
+    reserva_id = cursor.lastrowid
+    esgotados = registrar_equipamentos_reserva(cursor, reserva_id, equipamento_ids)
+    if esgotados:
+        raise EscritaRecusada(f'Equipamento indisponível neste período: {", ".join(esgotados)}.')
+    return reserva_id
+
+def atualizar_reserva(cursor, id, nome, matricula, setor_id, sala_id, data, periodo, equipamento_ids=()):
+    cursor.execute('''
+        UPDATE Reservas
+        SET nome = ?, matricula = ?, setor_id = ?, sala_id = ?, data = ?, periodo = ?
+        WHERE id = ?
+    ''', (nome, matricula, setor_id, sala_id, data, periodo, id))
+    if cursor.rowcount == 0:
+        raise EscritaRecusada('Reserva não encontrada.')
+    esgotados = registrar_equipamentos_reserva(cursor, id, equipamento_ids)
+    if esgotados:
+        raise EscritaRecusada(f'Equipamento indisponível neste período: {", ".join(esgotados)}.')
+
+def excluir_reserva(cursor, id):
+    # Os equipamentos voltam ao estoque com a remoção em cascata do livro
+    cursor.execute('DELETE FROM Reservas WHERE id = ?', (id,))
+    return cursor.rowcount
+
+def inserir_equipamento(cursor, nome, quantidade):
+    cursor.execute('INSERT INTO Equipamentos (nome, quantidade) VALUES (?, ?)', (nome, quantidade))
+    return cursor.lastrowid
+
+def atualizar_equipamento(cursor, id, nome, quantidade):
+    cursor.execute('UPDATE Equipamentos SET nome = ?, quantidade = ? WHERE id = ?', (nome, quantidade, id))
+    return cursor.rowcount
+
+def excluir_equipamento(cursor, id):
+    cursor.execute('DELETE FROM Equipamentos WHERE id = ?', (id,))
+    return cursor.rowcount
+
+def excluir_usuario(cursor, id):
+    """Remove o usuário e as reservas dele; retorna (username, cargo, reservas_removidas)"""
+    cursor.execute('SELECT username, cargo FROM Users WHERE id = ?', (id,))
+    user = cursor.fetchone()
+    if not user:
+        raise EscritaRecusada('Usuário não encontrado.')
+    username, cargo = user
+
+    if username == 'admin@ses':
+        raise EscritaRecusada('Não é possível excluir o usuário admin padrão.')
+
+    # Impedir exclusão do último admin
+    cursor.execute("SELECT COUNT(*) FROM Users WHERE cargo = 'admin'")
+    if cargo == 'admin' and cursor.fetchone()[0] <= 1:
+        raise EscritaRecusada('Não é possível excluir o último administrador.')
+
+    cursor.execute('DELETE FROM Reservas WHERE user_id = ?', (id,))
+    reservas_removidas = cursor.rowcount
+    cursor.execute('DELETE FROM Users WHERE id = ?', (id,))
+    # O evento de auditoria é registrado pela rota (auditoria.py), fora da transação
+    return username, cargo, reservas_removidas
+
+def alterar_usuario(cursor, id, username, cargo):
+    # Não permitir alterar cargo de admin
+    cursor.execute('SELECT cargo FROM Users WHERE id = ?', (id,))
+    user = cursor.fetchone()
+    if user and user[0] == 'admin' and cargo != 'admin':
+        raise EscritaRecusada('Não é possível alterar o cargo de um administrador.')
+    cursor.execute('UPDATE Users SET username = ?, cargo = ? WHERE id = ?', (username, cargo, id))
+
+def inserir_usuario(cursor, username, password_hash, cargo):
+    cursor.execute('''
+        INSERT INTO Users (username, password_hash, cargo, created_at) 
+        VALUES (?, ?, ?, datetime('now'))
+    ''', (username, password_hash, cargo))
+    return cursor.lastrowid
+
+def gravar_hash_senha(cursor, id, password_hash):
+    cursor.execute('UPDATE Users SET password_hash = ? WHERE id = ?', (password_hash, id))
+
+def recalcular_contadores(cursor):
+    cursor.execute('''
+        UPDATE Users SET num_reservas = (
+            SELECT COUNT(*) FROM Reservas r WHERE r.user_id = Users.id
+        )
+    ''')
+    return cursor.rowcount
+
+def gravar_login(cursor, username):
+    cursor.execute('''
+        UPDATE Users 
+        SET last_login = datetime('now') 
+        WHERE username = ?
+    ''', (username,))
+
+def adicionar_usuario(username, password, cargo, metodo_hash=None):
     if cargo not in ['admin', 'cotead', 'colaborador']:
         return False, "Cargo inválido"
-        
-    conn = conectar()
-    cursor = conn.cursor()
+
+    import escrita
     try:
-        password_hash = generate_password_hash(password)
-        cursor.execute('''
-            INSERT INTO Users (username, password_hash, cargo, created_at) 
-            VALUES (?, ?, ?, datetime('now'))
-        ''', (username, password_hash, cargo))
-        conn.commit()
+        # O hash é gerado fora da thread de escrita, que só faz o INSERT
+        password_hash = senhas.gerar_hash(password, metodo_hash)
+        escrita.executar(inserir_usuario, username, password_hash, cargo)
         return True, "Usuário criado com sucesso"
     except sqlite3.IntegrityError:
         return False, "Nome de usuário já existe"
     except Exception as e:
         return False, f"Erro ao criar usuário: {str(e)}"
-    finally:
-        conn.close()
 
 def buscar_usuario(username):
     conn = conectar()
@@ -184,172 +601,43 @@ def buscar_usuario(username):
 def verificar_senha(user, password):
     if not user or not user[2]:
         return False
-    return check_password_hash(user[2], password)
+    # Verificação no pool de processos; hashes fora da política atual são refeitos
+    confere, novo_hash = senhas.verificar(user[2], password)
+    if confere and novo_hash and not SOMENTE_LEITURA:
+        atualizar_hash_senha(user[0], novo_hash)
+    return confere
+
+def atualizar_hash_senha(id, password_hash):
+    import escrita
+    escrita.executar(gravar_hash_senha, id, password_hash)
 
 def buscar_todos_usuarios():
     conn = conectar()
     cursor = conn.cursor()
     try:
+        # num_reservas é mantido por triggers em Reservas (ver recalcular_contadores_reservas)
         cursor.execute('''
-            SELECT u.*, COUNT(r.id) as num_reservas 
-            FROM Users u 
-            LEFT JOIN Reservas r ON u.username = r.nome 
-            WHERE u.active = 1 
-            GROUP BY u.id 
-            ORDER BY u.username
+            SELECT id, username, password_hash, cargo, created_at, last_login, active, num_reservas
+            FROM Users
+            WHERE active = 1
+            ORDER BY username
         ''')
         return cursor.fetchall()
     finally:
         conn.close()
 
-def deletar_usuario(id, admin_username):
-    conn = conectar()
-    cursor = conn.cursor()
-    
-    try:
-        # Verificar se usuário existe e está ativo
-        cursor.execute('SELECT username, cargo, active FROM Users WHERE id = ?', (id,))
-        user = cursor.fetchone()
-        
-        if not user:
-            return False, "Usuário não encontrado"
-            
-        if not user[2]:  # active = False
-            return False, "Usuário já está inativo"
-            
-        username, cargo = user[0], user[1]
-        
-        # Verificar se é o admin padrão
-        if username == 'admin@ses':
-            return False, "Não é possível excluir o usuário admin padrão"
-        
-        # Verificar se é o último admin
-        if cargo == 'admin':
-            cursor.execute('SELECT COUNT(*) FROM Users WHERE cargo = "admin" AND active = 1')
-            if cursor.fetchone()[0] <= 1:
-                return False, "Não é possível excluir o último administrador"
-        
-        cursor.execute('BEGIN TRANSACTION')
-        
-        # Soft delete do usuário
-        deleted_username = f"{username}_deleted_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        cursor.execute('UPDATE Users SET active = 0, username = ? WHERE id = ?', 
-                      (deleted_username, id))
-        
-        # Remover reservas
-        cursor.execute('DELETE FROM Reservas WHERE nome = ? OR matricula = ?', 
-                      (username, username))
-        
-        # Registrar na auditoria
-        cursor.execute('''
-            INSERT INTO AuditLog (admin_username, action, target_username, target_cargo, details) 
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            admin_username,
-            'delete_user',
-            username,
-            cargo,
-            f"Deleted by {admin_username} at {datetime.now()}"
-        ))
-        
-        cursor.execute('COMMIT')
-        return True, f"Usuário {username} excluído com sucesso"
-        
-    except Exception as e:
-        cursor.execute('ROLLBACK')
-        return False, f"Erro ao excluir usuário: {str(e)}"
-    finally:
-        conn.close()
-
-def atualizar_usuario(id, novo_username=None, novo_cargo=None, admin_username=None):
-    conn = conectar()
-    cursor = conn.cursor()
-    
-    try:
-        # Verificar se usuário existe e está ativo
-        cursor.execute('SELECT username, cargo, active FROM Users WHERE id = ?', (id,))
-        user = cursor.fetchone()
-        
-        if not user:
-            return False, "Usuário não encontrado"
-            
-        if not user[2]:  # active = False
-            return False, "Usuário está inativo"
-            
-        username, cargo = user[0], user[1]
-        
-        # Verificar alterações no admin padrão
-        if username == 'admin@ses' and novo_cargo and novo_cargo != 'admin':
-            return False, "Não é possível alterar o cargo do admin padrão"
-        
-        # Verificar alteração do último admin
-        if cargo == 'admin' and novo_cargo and novo_cargo != 'admin':
-            cursor.execute('SELECT COUNT(*) FROM Users WHERE cargo = "admin" AND active = 1')
-            if cursor.fetchone()[0] <= 1:
-                return False, "Não é possível alterar o cargo do último administrador"
-        
-        cursor.execute('BEGIN TRANSACTION')
-        
-        updates = []
-        params = []
-        
-        if novo_username:
-            updates.append('username = ?')
-            params.append(novo_username)
-        
-        if novo_cargo:
-            if novo_cargo not in ['admin', 'cotead', 'colaborador']:
-                return False, "Cargo inválido"
-            updates.append('cargo = ?')
-            params.append(novo_cargo)
-        
-        if updates:
-            params.append(id)
-            cursor.execute(f'''
-                UPDATE Users 
-                SET {', '.join(updates)}
-                WHERE id = ?
-            ''', params)
-            
-            # Registrar na auditoria
-            cursor.execute('''
-                INSERT INTO AuditLog (
-                    admin_username, action, target_username, 
-                    target_cargo, details
-                ) VALUES (?, ?, ?, ?, ?)
-            ''', (
-                admin_username,
-                'update_user',
-                username,
-                cargo,
-                f"Updated by {admin_username}: {', '.join(updates)}"
-            ))
-        
-        cursor.execute('COMMIT')
-        return True, "Usuário atualizado com sucesso"
-        
-    except sqlite3.IntegrityError:
-        cursor.execute('ROLLBACK')
-        return False, "Nome de usuário já existe"
-    except Exception as e:
-        cursor.execute('ROLLBACK')
-        return False, f"Erro ao atualizar usuário: {str(e)}"
-    finally:
-        conn.close()
+def recalcular_contadores_reservas():
+    """Recalcula Users.num_reservas a partir de Reservas (correção de divergências)"""
+    import escrita
+    return escrita.executar(recalcular_contadores)
 
 def registrar_login(username):
-    conn = conectar()
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            UPDATE Users 
-            SET last_login = datetime('now') 
-            WHERE username = ?
-        ''', (username,))
-        conn.commit()
-    finally:
-        conn.close()
+    import escrita
+    escrita.executar(gravar_login, username)
 
 if __name__ == '__main__':
+    import sys
     criar_tabelas()
-    print("Banco de dados inicializado com sucesso.")
\ No newline at end of file
+    print("Banco de dados inicializado com sucesso.")
+    if '--recalcular-contadores' in sys.argv:
+        print(f"Contadores de reservas recalculados para {recalcular_contadores_reservas()} usuários.")
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Views do cadastro de equipamentos (blueprint 'equipamentos').
+
+As regras de URL ficam em app.ROTAS_ADMIN: com APP_ADMIN_PREGUICOSO=1 este
+módulo só é importado na primeira requisição que chegar a uma delas.
+"""
+
+from flask import flash, jsonify, redirect, render_template, request, url_for
+from database import (conectar, conexao, disponibilidade_equipamentos, inserir_equipamento,
+                      atualizar_equipamento, excluir_equipamento)
+import escrita
+from permissoes import requer_cargo
+from respostas import data_parametro
+
+
+@requer_cargo(['admin'])
+def equipamentos():
+    if request.method == 'POST':
+        nome_equip = request.form['nome']
+        quantidade = request.form['quantidade']
+
+        try:
+            escrita.executar(inserir_equipamento, nome_equip, quantidade)
+            flash('Equipamento cadastrado com sucesso!', 'success')
+        except Exception as e:
+            print(f"Erro ao cadastrar equipamento: {e}")
+            flash('Erro ao cadastrar equipamento.', 'error')
+
+        return redirect(url_for('equipamentos.equipamentos'))
+
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM Equipamentos')
+    equipamentos = cursor.fetchall()
+    conn.close()
+
+    return render_template('equipamentos.html', equipamentos=equipamentos)
+
+
+@requer_cargo(['admin', 'cotead', 'colaborador'])
+def disponibilidade():
+    """Disponibilidade de cada equipamento para a data e período do formulário"""
+    try:
+        data = data_parametro('data')
+    except ValueError:
+        data = None
+    periodo = request.args.get('periodo')
+    if not data or periodo not in ('matutino', 'vespertino', 'integral'):
+        return jsonify({'error': 'Informe data (AAAA-MM-DD) e período válidos'}), 400
+
+    with conexao() as conn:
+        linhas = disponibilidade_equipamentos(
+            conn.cursor(), data, periodo, request.args.get('reserva_id', type=int))
+    return jsonify([{
+        'id': linha[0],
+        'nome': linha[1],
+        'quantidade': linha[2],
+        'disponivel': max(linha[3], 0)
+    } for linha in linhas])
+
+
+@requer_cargo(['admin','cotead','colaborador'])
+def deletar_equipamento(id):
+    try:
+        escrita.executar(excluir_equipamento, id)
+        flash('Equipamento excluído com sucesso!', 'success')
+    except Exception as e:
+        print(f"Erro ao deletar equipamento: {e}")
+        flash('Erro ao excluir equipamento.', 'error')
+
+    return redirect(url_for('equipamentos.equipamentos'))
+
+
+@requer_cargo(['admin'])
+def editar_equipamento(id):
+    if request.method == 'POST':
+        nome = request.form['nome']
+        quantidade = request.form['quantidade']
+
+        try:
+            escrita.executar(atualizar_equipamento, id, nome, quantidade)
+            flash('Equipamento atualizado com sucesso!', 'success')
+        except Exception as e:
+            print(f"Erro ao atualizar equipamento: {e}")
+            flash('Erro ao atualizar equipamento.', 'error')
+
+        return redirect(url_for('equipamentos.equipamentos'))
+
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM Equipamentos WHERE id = ?', (id,))
+    equipamento = cursor.fetchone()
+    conn.close()
+
+    return render_template('editar_equipamento.html', equipamento=equipamento)
@@ -0,0 +1,228 @@
+"""
+Escrita serializada no SQLite
+
+Uma thread por processo executa as unidades de escrita em transações BEGIN
+IMMEDIATE. Unidades que chegam juntas são confirmadas num único COMMIT, cada
+uma isolada por um SAVEPOINT: a falha de uma não desfaz as outras. As
+leituras continuam nas conexões do pool, sobre o snapshot do WAL.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from database import conexao_dedicada
+
+# Unidades confirmadas no mesmo COMMIT
+ESCRITA_LOTE = int(os.environ.get('ESCRITA_LOTE', 32))
+# Tentativas de obter o lock de escrita antes de desistir
+ESCRITA_TENTATIVAS = int(os.environ.get('ESCRITA_TENTATIVAS', 8))
+ESCRITA_BUSY_MS = int(os.environ.get('ESCRITA_BUSY_MS', 250))
+ESCRITA_RECUO_MAX = float(os.environ.get('ESCRITA_RECUO_MAX', 2.0))
+# Tempo máximo que a requisição espera a unidade entrar em execução
+ESCRITA_TIMEOUT = float(os.environ.get('ESCRITA_TIMEOUT', 30))
+
+_lock = threading.Lock()
+_fila = None
+_thread = None
+_pid = None
+_metricas = {
+    'unidades': 0, 'falhas': 0, 'lotes': 0, 'maior_lote': 0, 'fila_max': 0,
+    'retentativas': 0, 'espera_lock_ms': 0.0, 'espera_lock_max_ms': 0.0,
+}
+
+
+class _Unidade:
+    __slots__ = ('funcao', 'args', 'kwargs', 'futuro')
+
+    def __init__(self, funcao, args, kwargs):
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.futuro = Future()
+
+
+def _ocupado(erro):
+    mensagem = str(erro).lower()
+    return 'locked' in mensagem or 'busy' in mensagem
+
+
+def _iniciar_transacao(cursor):
+    """BEGIN IMMEDIATE com recuo exponencial limitado; devolve a espera em ms"""
+    inicio = time.perf_counter()
+    recuo = 0.05
+    for tentativa in range(ESCRITA_TENTATIVAS):
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            break
+        except sqlite3.OperationalError as e:
+            if not _ocupado(e) or tentativa == ESCRITA_TENTATIVAS - 1:
+                raise
+            with _lock:
+                _metricas['retentativas'] += 1
+            time.sleep(recuo)
+            recuo = min(recuo * 2, ESCRITA_RECUO_MAX)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def _executar_lote(conn, lote):
+    cursor = conn.cursor()
+    lote = [u for u in lote if u.futuro.set_running_or_notify_cancel()]
+    if not lote:
+        return
+    try:
+        espera = _iniciar_transacao(cursor)
+    except Exception as e:
+        for unidade in lote:
+            unidade.futuro.set_exception(e)
+        return
+
+    resultados = []
+    for unidade in lote:
+        cursor.execute('SAVEPOINT unidade')
+        try:
+            resultado = unidade.funcao(cursor, *unidade.args, **unidade.kwargs)
+            cursor.execute('RELEASE unidade')
+            resultados.append((unidade, resultado, None))
+        except Exception as e:
+            cursor.execute('ROLLBACK TO unidade')
+            cursor.execute('RELEASE unidade')
+            resultados.append((unidade, None, e))
+
+    try:
+        cursor.execute('COMMIT')
+    except Exception as e:
+        if conn.in_transaction:
+            cursor.execute('ROLLBACK')
+        resultados = [(unidade, None, e) for unidade, _, _ in resultados]
+
+    with _lock:
+        _metricas['lotes'] += 1
+        _metricas['unidades'] += len(resultados)
+        _metricas['falhas'] += sum(1 for _, _, erro in resultados if erro is not None)
+        _metricas['maior_lote'] = max(_metricas['maior_lote'], len(resultados))
+        _metricas['espera_lock_ms'] += espera
+        _metricas['espera_lock_max_ms'] = max(_metricas['espera_lock_max_ms'], espera)
+
+    # Os resultados só são entregues depois do COMMIT
+    for unidade, resultado, erro in resultados:
+        if erro is None:
+            unidade.futuro.set_result(resultado)
+        else:
+            unidade.futuro.set_exception(erro)
+
+
+def _abandonar(fila, erro):
+    """Sem conexão: falha as unidades na fila e libera a próxima chamada para
+    criar outra thread (e tentar abrir o banco de novo)"""
+    global _fila, _thread
+    with _lock:
+        if _fila is fila:
+            _fila = _thread = None
+    while True:
+        try:
+            unidade = fila.get_nowait()
+        except queue.Empty:
+            return
+        if unidade is not None and unidade.futuro.set_running_or_notify_cancel():
+            unidade.futuro.set_exception(erro)
+
+
+def _laco(fila):
+    try:
+        conn = conexao_dedicada()
+    except Exception as e:
+        _abandonar(fila, e)
+        return
+    conn.isolation_level = None  # BEGIN/COMMIT explícitos
+    conn.execute(f'PRAGMA busy_timeout = {ESCRITA_BUSY_MS}')
+    parar = False
+    while not parar:
+        unidade = fila.get()
+        if unidade is None:
+            break
+        lote = [unidade]
+        while len(lote) < ESCRITA_LOTE:
+            try:
+                proxima = fila.get_nowait()
+            except queue.Empty:
+                break
+            if proxima is None:
+                parar = True
+                break
+            lote.append(proxima)
+        try:
+            _executar_lote(conn, lote)
+        except Exception as e:
+            print(f"Erro na thread de escrita: {e}")
+            if conn.in_transaction:
+                try:
+                    conn.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+            for unidade in lote:
+                if not unidade.futuro.done():
+                    unidade.futuro.set_exception(e)
+    conn.close()
+
+
+def _obter_fila():
+    global _fila, _thread, _pid
+    with _lock:
+        # A thread não sobrevive ao fork dos workers do gunicorn
+        if _fila is None or _pid != os.getpid():
+            _fila = queue.Queue()
+            _thread = threading.Thread(target=_laco, args=(_fila,), name='escritor-sqlite', daemon=True)
+            _thread.start()
+            _pid = os.getpid()
+        return _fila
+
+
+def executar(funcao, *args, **kwargs):
+    """Executa funcao(cursor, *args, **kwargs) na thread de escrita.
+
+    Devolve o resultado depois do COMMIT ou relança a exceção da unidade,
+    cujas alterações já foram desfeitas."""
+    if _thread is not None and threading.current_thread() is _thread:
+        raise RuntimeError('executar() chamado de dentro de uma unidade de escrita')
+    unidade = _Unidade(funcao, args, kwargs)
+    fila = _obter_fila()
+    fila.put(unidade)
+    profundidade = fila.qsize()
+    with _lock:
+        _metricas['fila_max'] = max(_metricas['fila_max'], profundidade)
+    try:
+        return unidade.futuro.result(timeout=ESCRITA_TIMEOUT)
+    except TimeoutError:
+        if unidade.futuro.cancel():
+            raise TimeoutError('Fila de escrita ocupada; tente novamente')
+        # Já em execução: o resultado sai em seguida
+        return unidade.futuro.result()
+
+
+def estatisticas():
+    with _lock:
+        ativa = _fila is not None and _pid == os.getpid()
+        return dict(_metricas,
+                    espera_lock_ms=round(_metricas['espera_lock_ms'], 1),
+                    espera_lock_max_ms=round(_metricas['espera_lock_max_ms'], 1),
+                    fila=_fila.qsize() if ativa else 0,
+                    ativa=ativa)
+
+
+def encerrar(timeout=5):
+    """Processa o que estiver na fila e encerra a thread de escrita"""
+    global _fila, _thread
+    with _lock:
+        fila, thread = _fila, _thread
+        if fila is None or _pid != os.getpid():
+            return
+        _fila = _thread = None
+    fila.put(None)
+    thread.join(timeout)
+
+
+atexit.register(encerrar)
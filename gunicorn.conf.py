@@ -1,23 +1,51 @@
 # Configuração do Gunicorn para Render
 import os
 
+# Modo de execução: "gthread" (padrão), "sync" ou "gevent" (requer pip install gevent)
+MODO = os.environ.get('GUNICORN_MODO', 'gthread')
+if MODO == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        print("[AVISO] gevent não instalado; usando gthread")
+        MODO = 'gthread'
+
+# Matriz workers x threads derivada da CPU e do orçamento de memória. Cada
+# worker custa um processo Python, o processo de verificação de senhas e o
+# cache das conexões SQLite; threads só custam a pilha e uma conexão do pool.
+CPUS = os.cpu_count() or 1
+MEMORIA_MB = int(os.environ.get('WEB_MEMORIA_MB', 512))  # plano free do Render
+MEMORIA_WORKER_MB = int(os.environ.get('WEB_MEMORIA_WORKER_MB', 200))
+MEMORIA_MASTER_MB = 40
+WORKERS_POR_MEMORIA = max(1, (MEMORIA_MB - MEMORIA_MASTER_MB) // MEMORIA_WORKER_MB)
+
 # Configurações de servidor
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
-workers = 1  # Para plano free do Render
-worker_class = "sync"
-worker_connections = 1000
+workers = int(os.environ.get('WEB_CONCURRENCY', min(CPUS, WORKERS_POR_MEMORIA)))
+worker_class = MODO
+# Com o GIL, mais de ~4 threads por CPU só aumentam a cauda de latência
+threads = int(os.environ.get('GUNICORN_THREADS', min(16, 4 * CPUS) if MODO == 'gthread' else 1))
+worker_connections = 1000  # gevent: clientes por worker; gthread: conexões keep-alive
 timeout = 120
 keepalive = 2
-max_requests = 1000
+# Reciclar o worker descarta as requisições já aceitas pelas outras threads;
+# com threads o limite cresce na mesma proporção
+max_requests = 1000 * threads
 max_requests_jitter = 100
 
+# Uma conexão do pool por thread, mais uma para acessos aninhados
+# (lido por database.py ao importar o app)
+os.environ.setdefault('DB_POOL_TAMANHO', str(threads + 1))
+
 # Configurações de log
 loglevel = "info"
 accesslog = "-"
 errorlog = "-"
 
 # Configurações de inicialização
-preload_app = True
+# O gevent aplica o monkey patch no worker; locks e o pool criados pelo master
+# com preload seriam os do threading original e bloqueariam o hub
+preload_app = MODO != 'gevent'
 daemon = False
 
 # Configurações de performance
@@ -25,7 +53,12 @@ worker_tmp_dir = "/dev/shm"
 
 # Função executada quando o master inicia
 def on_starting(server):
+    # Retratos de métricas de execuções anteriores não entram na soma
+    import metricas
+    metricas.limpar()
     server.log.info("Servidor Gunicorn iniciando...")
+    server.log.info("Modo %s: %s worker(s) x %s thread(s), pool de %s conexões",
+                    MODO, workers, threads, os.environ['DB_POOL_TAMANHO'])
 
 # Função executada quando um worker é criado
 def when_ready(server):
@@ -35,11 +68,39 @@ def when_ready(server):
 def worker_abort(worker):
     worker.log.info("Worker abortado")
 
+def worker_exit(server, worker):
+    # Grava a auditoria pendente e o retrato final das métricas e confirma
+    # as escritas ainda na fila antes de o worker sair
+    import auditoria
+    auditoria.encerrar()
+    import metricas
+    metricas.encerrar()
+    import escrita
+    escrita.encerrar()
+    # O retrato do perfil SQL sai do relatório junto com o worker
+    import perfil_sql
+    perfil_sql.encerrar()
+    import senhas
+    senhas.encerrar()
+
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    if not preload_app:
+        # Nada foi herdado do master; importar os módulos aqui os carregaria
+        # antes do monkey patch do gevent
+        return
+    # Conexões abertas pelo master (preload_app) não podem ser usadas no worker
+    from database import resetar_pool
+    resetar_pool()
+    # Processos de verificação de senha nascem antes de o worker abrir threads
+    import senhas
+    senhas.iniciar()
 
 def pre_fork(server, worker):
-    pass
+    if not preload_app:
+        return
+    from database import fechar_pool
+    fechar_pool()
 
 def worker_int(worker):
     worker.log.info("worker received INT or QUIT signal")
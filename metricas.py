@@ -0,0 +1,389 @@
+"""
+Métricas no formato texto do Prometheus (/metrics), sem dependências
+
+Cada processo conta as requisições por endpoint, método e status, mede a
+latência em histogramas por endpoint e acompanha as requisições em
+andamento. Os coletores (pool de conexões, thread de escrita, auditoria,
+caches) são lidos no momento da coleta.
+
+Com vários workers do gunicorn, cada processo grava a cada
+METRICAS_INTERVALO segundos um retrato do seu estado em METRICAS_DIR
+(/dev/shm por padrão), com troca atômica do arquivo. O worker que atende
+/metrics soma os retratos dos demais ao seu estado atual. Contadores e
+histogramas de workers encerrados continuam na soma para que os totais não
+voltem atrás; gauges só contam os processos vivos. O master apaga os
+retratos de execuções anteriores ao iniciar (limpar()).
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+METRICAS_DIR = os.environ.get('METRICAS_DIR', '/dev/shm/ses-metricas' if os.path.isdir('/dev/shm')
+                              else os.path.join(tempfile.gettempdir(), 'ses-metricas'))
+METRICAS_INTERVALO = float(os.environ.get('METRICAS_INTERVALO', 5.0))
+# Se definido, /metrics exige o cabeçalho "Authorization: Bearer <token>"
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+# Limites superiores (segundos) dos baldes dos histogramas de latência
+BALDES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+# coletor -> campo -> (métrica, tipo, ajuda, divisor); os campos em
+# milissegundos são expostos em segundos. Gauges terminados em _max são
+# agregados pelo máximo entre os workers, os demais pela soma.
+CAMPOS = {
+    'pool': {
+        'checkouts': ('ses_db_pool_emprestimos_total', 'counter', 'Conexões emprestadas do pool', 1),
+        'esperas': ('ses_db_pool_esperas_total', 'counter', 'Empréstimos que esperaram uma conexão livre', 1),
+        'espera_ms': ('ses_db_pool_espera_segundos_total', 'counter', 'Tempo total de espera por uma conexão livre', 1000),
+        'aberturas': ('ses_db_conexoes_abertas_total', 'counter', 'Conexões SQLite abertas', 1),
+        'excedentes': ('ses_db_pool_excedentes_total', 'counter', 'Conexões avulsas abertas com o pool esgotado', 1),
+        'em_uso': ('ses_db_pool_em_uso', 'gauge', 'Conexões do pool emprestadas agora', 1),
+        'livres': ('ses_db_pool_livres', 'gauge', 'Conexões ociosas no pool', 1),
+    },
+    'escrita': {
+        'unidades': ('ses_escrita_unidades_total', 'counter', 'Unidades executadas pela thread de escrita', 1),
+        'falhas': ('ses_escrita_falhas_total', 'counter', 'Unidades de escrita desfeitas por erro', 1),
+        'lotes': ('ses_escrita_lotes_total', 'counter', 'Transações (COMMITs) da thread de escrita', 1),
+        'retentativas': ('ses_escrita_retentativas_total', 'counter', 'BEGIN IMMEDIATE repetidos por lock ocupado', 1),
+        'espera_lock_ms': ('ses_escrita_espera_lock_segundos_total', 'counter', 'Tempo total esperando o lock de escrita do SQLite', 1000),
+        'espera_lock_max_ms': ('ses_escrita_espera_lock_segundos_max', 'gauge', 'Maior espera pelo lock de escrita', 1000),
+        'fila': ('ses_escrita_fila', 'gauge', 'Unidades aguardando a thread de escrita', 1),
+    },
+    'auditoria': {
+        'registrados': ('ses_auditoria_eventos_total', 'counter', 'Eventos de auditoria registrados', 1),
+        'gravados': ('ses_auditoria_gravados_total', 'counter', 'Eventos de auditoria gravados no banco', 1),
+        'descartados': ('ses_auditoria_descartados_total', 'counter', 'Eventos descartados com o buffer cheio', 1),
+        'pendentes': ('ses_auditoria_pendentes', 'gauge', 'Eventos no buffer aguardando gravação', 1),
+    },
+    'processo': {
+        'cpu_segundos': ('ses_processo_cpu_segundos_total', 'counter', 'Tempo de CPU (usuário + sistema) dos workers', 1),
+        'rss_bytes': ('ses_processo_memoria_residente_bytes', 'gauge', 'Memória residente dos workers', 1),
+    },
+}
+# Campos dos coletores de cache (CacheLRU.estatisticas), com o rótulo cache="<nome>"
+CAMPOS_CACHE = {
+    'hits': ('ses_cache_acertos_total', 'counter', 'Consultas atendidas pelo cache', 1),
+    'misses': ('ses_cache_faltas_total', 'counter', 'Consultas que não estavam no cache', 1),
+    'evictions': ('ses_cache_descartes_total', 'counter', 'Itens descartados pelo limite de tamanho', 1),
+    'itens': ('ses_cache_itens', 'gauge', 'Itens no cache', 1),
+    'bytes': ('ses_cache_bytes', 'gauge', 'Bytes ocupados pelo cache', 1),
+}
+
+_lock = threading.Lock()
+_pid = None
+_thread = None
+_parar = False
+_requisicoes = {}  # (endpoint, metodo, status) -> contagem
+_histogramas = {}  # endpoint -> [contagem por balde..., contagem total, soma]
+_em_andamento = 0
+_coletores = {}  # nome -> função que devolve um dict de estatísticas
+_caches = {}  # nome -> função (CacheLRU.estatisticas)
+
+
+def _geracao():
+    # Definida pelo master do gunicorn; fora dele cada processo é a própria geração
+    return os.environ.get('METRICAS_GERACAO') or str(os.getpid())
+
+
+def _verificar_fork():
+    global _pid, _thread, _requisicoes, _histogramas, _em_andamento
+    if _pid != os.getpid():
+        # Contagens herdadas do master pertencem a ele, não ao worker
+        _pid = os.getpid()
+        _thread = None
+        _requisicoes, _histogramas, _em_andamento = {}, {}, 0
+
+
+def registrar_coletor(nome, funcao):
+    _coletores[nome] = funcao
+
+
+def registrar_cache(nome, funcao):
+    _caches[nome] = funcao
+
+
+def inicio_requisicao():
+    global _em_andamento
+    with _lock:
+        _verificar_fork()
+        _em_andamento += 1
+    if _thread is None and METRICAS_DIR:
+        _iniciar()
+
+
+def fim_requisicao(endpoint, metodo, status, duracao):
+    """Conta a requisição e registra a duração (segundos) no histograma do endpoint"""
+    global _em_andamento
+    with _lock:
+        _verificar_fork()
+        _em_andamento = max(_em_andamento - 1, 0)
+        chave = (endpoint, metodo, status)
+        _requisicoes[chave] = _requisicoes.get(chave, 0) + 1
+        histograma = _histogramas.get(endpoint)
+        if histograma is None:
+            histograma = _histogramas[endpoint] = [0] * (len(BALDES) + 2)
+        for i, limite in enumerate(BALDES):
+            if duracao <= limite:
+                histograma[i] += 1
+                break
+        histograma[-2] += 1
+        histograma[-1] += duracao
+
+
+def _estado_processo():
+    uso = os.times()
+    estado = {'cpu_segundos': uso.user + uso.system}
+    try:
+        with open('/proc/self/statm') as arquivo:
+            estado['rss_bytes'] = int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    return estado
+
+
+def retrato():
+    """Estado atual do processo, no formato gravado em METRICAS_DIR"""
+    with _lock:
+        _verificar_fork()
+        estado = {
+            'pid': os.getpid(),
+            'requisicoes': [list(chave) + [n] for chave, n in _requisicoes.items()],
+            'histogramas': {endpoint: list(h) for endpoint, h in _histogramas.items()},
+            'em_andamento': _em_andamento,
+        }
+    coletores = {'processo': _estado_processo()}
+    for nome, funcao in list(_coletores.items()):
+        try:
+            coletores[nome] = funcao()
+        except Exception as e:
+            print(f"Erro no coletor de métricas {nome}: {e}")
+    estado['coletores'] = coletores
+    estado['caches'] = {}
+    for nome, funcao in list(_caches.items()):
+        try:
+            estado['caches'][nome] = funcao()
+        except Exception as e:
+            print(f"Erro no coletor de métricas do cache {nome}: {e}")
+    return estado
+
+
+def _arquivo(pid=None):
+    return os.path.join(METRICAS_DIR, f'{_geracao()}-{pid or os.getpid()}.json')
+
+
+def gravar():
+    """Grava o retrato do processo em METRICAS_DIR (troca atômica)"""
+    if not METRICAS_DIR:
+        return
+    os.makedirs(METRICAS_DIR, exist_ok=True)
+    destino = _arquivo()
+    temporario = destino + '.tmp'
+    with open(temporario, 'w') as arquivo:
+        json.dump(retrato(), arquivo)
+    os.replace(temporario, destino)
+
+
+def _laco():
+    while not _parar:
+        time.sleep(METRICAS_INTERVALO)
+        try:
+            gravar()
+        except Exception as e:
+            print(f"Erro ao gravar métricas: {e}")
+
+
+def _iniciar():
+    global _thread, _parar
+    with _lock:
+        # A thread não sobrevive ao fork dos workers do gunicorn
+        if _thread is not None:
+            return
+        _parar = False
+        _thread = threading.Thread(target=_laco, name='metricas', daemon=True)
+        _thread.start()
+
+
+def encerrar():
+    """Grava o retrato final do processo (worker_exit / atexit)"""
+    global _parar
+    _parar = True
+    # Só onde a coleta foi iniciada (worker que atendeu requisições): scripts
+    # que importam o módulo (CLI, init_db.py, backups, testes) não deixam retrato
+    if _thread is not None and _pid == os.getpid():
+        try:
+            gravar()
+        except Exception as e:
+            print(f"Erro ao gravar métricas: {e}")
+
+
+atexit.register(encerrar)
+
+
+def limpar():
+    """Inicia uma nova geração: apaga os retratos anteriores (master do gunicorn)"""
+    os.environ['METRICAS_GERACAO'] = str(os.getpid())
+    if METRICAS_DIR and os.path.isdir(METRICAS_DIR):
+        for nome in os.listdir(METRICAS_DIR):
+            if nome.endswith('.json') or nome.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(METRICAS_DIR, nome))
+                except OSError:
+                    pass
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retratos():
+    """O retrato atual deste processo mais os gravados pelos demais da geração"""
+    proprio = retrato()
+    retratos = [(proprio, True)]
+    if not METRICAS_DIR or not os.path.isdir(METRICAS_DIR):
+        return retratos
+    prefixo = f'{_geracao()}-'
+    for nome in os.listdir(METRICAS_DIR):
+        if not nome.startswith(prefixo) or not nome.endswith('.json'):
+            continue
+        try:
+            pid = int(nome[len(prefixo):-len('.json')])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        try:
+            with open(os.path.join(METRICAS_DIR, nome)) as arquivo:
+                retratos.append((json.load(arquivo), _vivo(pid)))
+        except (OSError, ValueError):
+            continue
+    return retratos
+
+
+def _rotulos(**rotulos):
+    if not rotulos:
+        return ''
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{chave}="{escapar(valor)}"' for chave, valor in rotulos.items()) + '}'
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        return repr(round(valor, 6))
+    return str(valor)
+
+
+def exposicao():
+    """Todas as métricas, somadas entre os workers, no formato texto do Prometheus"""
+    retratos = _retratos()
+    linhas = []
+
+    def cabecalho(nome, tipo, ajuda):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+
+    # Requisições e latência (contadores: todos os processos, vivos ou não)
+    requisicoes, histogramas = {}, {}
+    em_andamento = 0
+    for estado, vivo in retratos:
+        for endpoint, metodo, status, n in estado['requisicoes']:
+            chave = (endpoint, metodo, status)
+            requisicoes[chave] = requisicoes.get(chave, 0) + n
+        for endpoint, h in estado['histogramas'].items():
+            atual = histogramas.setdefault(endpoint, [0] * len(h))
+            for i, valor in enumerate(h):
+                atual[i] += valor
+        if vivo:
+            em_andamento += estado['em_andamento']
+
+    cabecalho('ses_requisicoes_total', 'counter', 'Requisições atendidas por endpoint, método e status')
+    for (endpoint, metodo, status), n in sorted(requisicoes.items()):
+        linhas.append(f'ses_requisicoes_total{_rotulos(endpoint=endpoint, metodo=metodo, status=status)} {n}')
+
+    cabecalho('ses_requisicao_duracao_segundos', 'histogram', 'Duração das requisições por endpoint')
+    for endpoint, h in sorted(histogramas.items()):
+        acumulado = 0
+        for limite, contagem in zip(BALDES, h):
+            acumulado += contagem
+            linhas.append(f'ses_requisicao_duracao_segundos_bucket{_rotulos(endpoint=endpoint, le=limite)} {acumulado}')
+        linhas.append(f'ses_requisicao_duracao_segundos_bucket{_rotulos(endpoint=endpoint, le="+Inf")} {h[-2]}')
+        linhas.append(f'ses_requisicao_duracao_segundos_sum{_rotulos(endpoint=endpoint)} {_numero(h[-1])}')
+        linhas.append(f'ses_requisicao_duracao_segundos_count{_rotulos(endpoint=endpoint)} {h[-2]}')
+
+    cabecalho('ses_requisicoes_em_andamento', 'gauge', 'Requisições sendo atendidas agora')
+    linhas.append(f'ses_requisicoes_em_andamento {em_andamento}')
+
+    cabecalho('ses_workers', 'gauge', 'Processos vivos que reportam métricas')
+    linhas.append(f'ses_workers {sum(1 for _, vivo in retratos if vivo)}')
+
+    # Coletores: contadores somados em todos os processos, gauges só nos vivos
+    def agregar(campos, obter):
+        for campo, (nome, tipo, ajuda, divisor) in campos.items():
+            valores = [obter(estado).get(campo) for estado, vivo in retratos
+                       if tipo == 'counter' or vivo]
+            valores = [v for v in valores if v is not None]
+            if not valores:
+                continue
+            total = max(valores) if nome.endswith('_max') else sum(valores)
+            cabecalho(nome, tipo, ajuda)
+            linhas.append(f'{nome} {_numero(total / divisor if divisor != 1 else total)}')
+
+    for coletor, campos in CAMPOS.items():
+        agregar(campos, lambda estado, coletor=coletor: estado['coletores'].get(coletor, {}))
+
+    nomes_cache = sorted({nome for estado, _ in retratos for nome in estado.get('caches', {})})
+    for campo, (nome, tipo, ajuda, _) in CAMPOS_CACHE.items():
+        cabecalho(nome, tipo, ajuda)
+        for cache in nomes_cache:
+            total = sum(estado.get('caches', {}).get(cache, {}).get(campo, 0)
+                        for estado, vivo in retratos if tipo == 'counter' or vivo)
+            linhas.append(f'{nome}{_rotulos(cache=cache)} {total}')
+    cabecalho('ses_cache_taxa_acerto', 'gauge', 'Fração das consultas atendidas pelo cache')
+    for cache in nomes_cache:
+        acertos = sum(estado.get('caches', {}).get(cache, {}).get('hits', 0) for estado, _ in retratos)
+        faltas = sum(estado.get('caches', {}).get(cache, {}).get('misses', 0) for estado, _ in retratos)
+        taxa = acertos / (acertos + faltas) if acertos + faltas else 0.0
+        linhas.append(f'ses_cache_taxa_acerto{_rotulos(cache=cache)} {_numero(taxa)}')
+
+    return '\n'.join(linhas) + '\n'
+
+
+def instalar(app):
+    """Mede todas as requisições do app e registra a rota /metrics"""
+    from flask import g, request
+
+    @app.before_request
+    def iniciar_medicao():
+        g.metricas_inicio = time.perf_counter()
+        inicio_requisicao()
+
+    @app.after_request
+    def guardar_status(resposta):
+        g.metricas_status = resposta.status_code
+        return resposta
+
+    @app.teardown_request
+    def finalizar_medicao(erro=None):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None:
+            return
+        status = g.get('metricas_status', 500)
+        fim_requisicao(request.endpoint or 'nao_encontrado', request.method, status,
+                       time.perf_counter() - inicio)
+
+    def metricas():
+        if METRICAS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICAS_TOKEN}':
+            return 'Não autorizado\n', 401, {'Content-Type': 'text/plain; charset=utf-8'}
+        return exposicao(), 200, {'Content-Type': TIPO_CONTEUDO}
+
+    app.add_url_rule('/metrics', 'metricas', metricas)
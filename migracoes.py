@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Migrações versionadas do esquema do banco
+Cada migração é aplicada uma única vez, em ordem, e registrada em schema_version
+"""
+
+import os
+import sqlite3
+import sys
+import zlib
+from database import conectar
+
+def _triggers_versao(tabela, colunas_update=None):
+    """SQL dos triggers que incrementam VersaoDados a cada escrita na tabela"""
+    corpo = f'''
+        BEGIN
+            UPDATE VersaoDados SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP
+            WHERE tabela = '{tabela}';
+        END;
+    '''
+    update = f'UPDATE OF {colunas_update}' if colunas_update else 'UPDATE'
+    sql = ''
+    for sufixo, evento in (('ins', 'INSERT'), ('upd', update), ('del', 'DELETE')):
+        sql += f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela.lower()}_versao_{sufixo}
+        AFTER {evento} ON {tabela}{corpo}'''
+    return sql
+
+
+def _triggers_alteracoes(tabela, chave=('id',), quando=''):
+    """SQL dos triggers que registram em Alteracoes a chave de cada linha alterada"""
+    def valor(linha):
+        return f"json_array({', '.join(f'{linha}.{c}' for c in chave)})"
+    sql = ''
+    for sufixo, evento, linha in (('ins', 'INSERT', 'NEW'), ('upd', 'UPDATE', 'NEW'), ('del', 'DELETE', 'OLD')):
+        corpo = f"INSERT INTO Alteracoes (tabela, operacao, chave) VALUES ('{tabela}', '{evento[0]}', {valor(linha)});"
+        if evento == 'UPDATE':
+            # Troca de chave: a chave antiga também deixa de existir
+            corpo += f"""
+            INSERT INTO Alteracoes (tabela, operacao, chave)
+            SELECT '{tabela}', 'D', {valor('OLD')} WHERE {valor('OLD')} != {valor('NEW')};"""
+        sql += f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela.lower()}_alteracoes_{sufixo}
+        AFTER {evento} ON {tabela}{quando}
+        BEGIN
+            {corpo}
+        END;'''
+    return sql
+
+
+# Tabelas com alterações registradas em Alteracoes e a chave de cada uma
+TABELAS_ALTERACOES = [(tabela, ('id',)) for tabela in
+                      ('Users', 'Sala', 'Setor', 'Equipamentos', 'SerieReserva', 'Reservas')]
+TABELAS_ALTERACOES.append(('ReservaEquipamento', ('reserva_id', 'equipamento_id')))
+
+
+def _captura_com_base(cursor):
+    """O registro de alterações só serve aos incrementais: passa a ser gravado
+    apenas enquanto houver uma base (linha em CapturaAlteracoes)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS CapturaAlteracoes (
+            id INTEGER PRIMARY KEY CHECK(id = 1),
+            desde DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for tabela, chave in TABELAS_ALTERACOES:
+        for sufixo in ('ins', 'upd', 'del'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_{tabela.lower()}_alteracoes_{sufixo}')
+        _executar(cursor, _triggers_alteracoes(
+            tabela, chave, quando='\n        WHEN EXISTS (SELECT 1 FROM CapturaAlteracoes)'))
+
+    # Com uma marca d'água os incrementais continuam de onde pararam; sem ela,
+    # o que foi registrado até aqui não será exportado por ninguém
+    import backup_data
+    if os.path.exists(os.path.join(backup_data.BACKUP_DIR, 'marca.json')):
+        cursor.execute('INSERT OR IGNORE INTO CapturaAlteracoes (id) VALUES (1)')
+    else:
+        cursor.execute('DELETE FROM Alteracoes')
+
+
+def _livro_equipamentos(cursor):
+    """Cria o livro de equipamentos por reserva a partir do texto Reservas.equipamentos"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ReservaEquipamento (
+            reserva_id INTEGER NOT NULL REFERENCES Reservas(id) ON DELETE CASCADE,
+            equipamento_id INTEGER NOT NULL REFERENCES Equipamentos(id) ON DELETE CASCADE,
+            quantidade INTEGER NOT NULL DEFAULT 1 CHECK(quantidade > 0),
+            PRIMARY KEY (reserva_id, equipamento_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reserva_equipamento_equip
+            ON ReservaEquipamento (equipamento_id, reserva_id)
+    ''')
+
+    cursor.execute('SELECT nome, MIN(id) FROM Equipamentos GROUP BY nome')
+    ids_por_nome = dict(cursor.fetchall())
+    cursor.execute("SELECT id, equipamentos FROM Reservas WHERE equipamentos IS NOT NULL AND equipamentos != ''")
+    itens = []
+    for reserva_id, texto in cursor.fetchall():
+        for nome in texto.split(', '):
+            if nome in ids_por_nome:
+                itens.append((reserva_id, ids_por_nome[nome]))
+    cursor.executemany('''
+        INSERT OR IGNORE INTO ReservaEquipamento (reserva_id, equipamento_id, quantidade)
+        VALUES (?, ?, 1)
+    ''', itens)
+
+    # Equipamentos.quantidade era decrementado a cada reserva e passa a ser o
+    # estoque total: devolve as unidades presas às reservas existentes
+    cursor.execute('''
+        UPDATE Equipamentos SET quantidade = quantidade + (
+            SELECT COALESCE(SUM(re.quantidade), 0)
+            FROM ReservaEquipamento re WHERE re.equipamento_id = Equipamentos.id
+        )
+    ''')
+
+
+def _normalizar_equipamentos(cursor):
+    """Completa o livro com nomes que só casam ignorando espaços e maiúsculas"""
+    cursor.execute('''
+        SELECT MIN(id), TRIM(nome) COLLATE NOCASE FROM Equipamentos
+        GROUP BY TRIM(nome) COLLATE NOCASE
+    ''')
+    ids_por_nome = {nome.lower(): id for id, nome in cursor.fetchall()}
+    cursor.execute("SELECT id, equipamentos FROM Reservas WHERE equipamentos IS NOT NULL AND equipamentos != ''")
+    itens = []
+    for reserva_id, texto in cursor.fetchall():
+        for nome in texto.split(','):
+            equipamento_id = ids_por_nome.get(nome.strip().lower())
+            if equipamento_id:
+                itens.append((reserva_id, equipamento_id))
+    cursor.execute('SELECT reserva_id, equipamento_id FROM ReservaEquipamento')
+    novos = set(itens) - set(cursor.fetchall())
+    cursor.executemany('''
+        INSERT INTO ReservaEquipamento (reserva_id, equipamento_id, quantidade)
+        VALUES (?, ?, 1)
+    ''', sorted(novos))
+    # Mesma devolução de estoque feita na migração 7, agora para os itens recuperados
+    cursor.executemany('UPDATE Equipamentos SET quantidade = quantidade + 1 WHERE id = ?',
+                       [(equipamento_id,) for _, equipamento_id in sorted(novos)])
+    _executar(cursor, '''
+        INSERT OR IGNORE INTO VersaoDados (tabela) VALUES ('ReservaEquipamento');
+    ''' + _triggers_versao('ReservaEquipamento'))
+
+
+# Lista ordenada de migrações: (versão, descrição, SQL ou função(cursor)).
+# Migrações são somente para frente: nunca altere uma já publicada,
+# acrescente uma nova no final.
+MIGRACOES = [
+    (1, 'Índices de Reservas e Users; tabela AuditLog', '''
+        -- user_id foi declarado como INTERGER; a afinidade continua INTEGER,
+        -- então não é necessário reconstruir a tabela.
+        CREATE INDEX IF NOT EXISTS idx_reservas_sala_data
+            ON Reservas (sala_id, data, periodo);
+        CREATE INDEX IF NOT EXISTS idx_reservas_data
+            ON Reservas (data, sala_id, setor_id);
+        CREATE INDEX IF NOT EXISTS idx_reservas_user ON Reservas (user_id);
+        CREATE INDEX IF NOT EXISTS idx_reservas_setor ON Reservas (setor_id);
+        CREATE INDEX IF NOT EXISTS idx_reservas_nome ON Reservas (nome);
+        CREATE INDEX IF NOT EXISTS idx_reservas_matricula ON Reservas (matricula);
+        CREATE INDEX IF NOT EXISTS idx_users_active_username
+            ON Users (active, username);
+        CREATE INDEX IF NOT EXISTS idx_users_cargo_active ON Users (cargo, active);
+
+        CREATE TABLE IF NOT EXISTS AuditLog (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_username TEXT NOT NULL,
+            action TEXT NOT NULL,
+            target_username TEXT NOT NULL,
+            target_cargo TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            details TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_auditlog_target
+            ON AuditLog (target_username, timestamp);
+    '''),
+    (2, 'Ocupação de salas por turno com unicidade garantida pelo banco', '''
+        -- Cada período ocupa um ou dois turnos (integral ocupa os dois)
+        CREATE TABLE IF NOT EXISTS PeriodoTurno (
+            periodo TEXT NOT NULL,
+            turno TEXT NOT NULL,
+            PRIMARY KEY (periodo, turno)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO PeriodoTurno (periodo, turno) VALUES
+            ('matutino', 'manha'),
+            ('vespertino', 'tarde'),
+            ('integral', 'manha'),
+            ('integral', 'tarde');
+
+        CREATE TABLE IF NOT EXISTS OcupacaoSala (
+            sala_id INTEGER NOT NULL,
+            data DATE NOT NULL,
+            turno TEXT NOT NULL CHECK(turno IN ('manha', 'tarde')),
+            reserva_id INTEGER NOT NULL,
+            PRIMARY KEY (sala_id, data, turno)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_ocupacao_reserva ON OcupacaoSala (reserva_id);
+
+        -- Reservas antigas em conflito mantêm apenas a ocupação da primeira
+        INSERT OR IGNORE INTO OcupacaoSala (sala_id, data, turno, reserva_id)
+            SELECT r.sala_id, r.data, pt.turno, r.id
+            FROM Reservas r
+            JOIN PeriodoTurno pt ON pt.periodo = r.periodo
+            ORDER BY r.id;
+
+        -- Um INSERT/UPDATE em Reservas que colida com um turno ocupado falha
+        -- por inteiro com UNIQUE constraint failed: OcupacaoSala...
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_ocupacao_ins
+        AFTER INSERT ON Reservas
+        BEGIN
+            INSERT INTO OcupacaoSala (sala_id, data, turno, reserva_id)
+                SELECT NEW.sala_id, NEW.data, turno, NEW.id
+                FROM PeriodoTurno WHERE periodo = NEW.periodo;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_ocupacao_upd
+        AFTER UPDATE OF sala_id, data, periodo ON Reservas
+        BEGIN
+            DELETE FROM OcupacaoSala WHERE reserva_id = OLD.id;
+            INSERT INTO OcupacaoSala (sala_id, data, turno, reserva_id)
+                SELECT NEW.sala_id, NEW.data, turno, NEW.id
+                FROM PeriodoTurno WHERE periodo = NEW.periodo;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_ocupacao_del
+        AFTER DELETE ON Reservas
+        BEGIN
+            DELETE FROM OcupacaoSala WHERE reserva_id = OLD.id;
+        END;
+    '''),
+    (3, 'Versão dos dados por tabela para invalidação de caches', '''
+        CREATE TABLE IF NOT EXISTS VersaoDados (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0,
+            atualizado_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO VersaoDados (tabela) VALUES
+            ('Reservas'), ('Sala'), ('Setor'), ('Users'), ('Equipamentos');
+    ''' + _triggers_versao('Reservas')
+          + _triggers_versao('Sala')
+          + _triggers_versao('Setor')
+          + _triggers_versao('Equipamentos')
+          # last_login muda a cada login e não afeta nenhum dado exibido em cache
+          + _triggers_versao('Users', 'username, cargo, active')),
+    (4, 'Horários de início e fim de cada período', '''
+        CREATE TABLE IF NOT EXISTS PeriodoHorario (
+            periodo TEXT PRIMARY KEY,
+            inicio TEXT NOT NULL,
+            fim TEXT NOT NULL
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO PeriodoHorario (periodo, inicio, fim) VALUES
+            ('matutino', '08:00', '12:00'),
+            ('vespertino', '13:00', '17:00'),
+            ('integral', '08:00', '17:00');
+    '''),
+    (5, 'Índice para a paginação das reservas por (data, id)', '''
+        -- O rowid (id) é a última coluna implícita do índice, então a ordem
+        -- data DESC, id DESC é lida direto do índice, sem ordenação temporária
+        CREATE INDEX IF NOT EXISTS idx_reservas_data_id ON Reservas (data);
+    '''),
+    (6, 'Contador de reservas por usuário mantido por triggers', '''
+        ALTER TABLE Users ADD COLUMN num_reservas INTEGER NOT NULL DEFAULT 0;
+        UPDATE Users SET num_reservas = (
+            SELECT COUNT(*) FROM Reservas r WHERE r.user_id = Users.id
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_contador_ins
+        AFTER INSERT ON Reservas
+        BEGIN
+            UPDATE Users SET num_reservas = num_reservas + 1 WHERE id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_contador_del
+        AFTER DELETE ON Reservas
+        BEGIN
+            UPDATE Users SET num_reservas = num_reservas - 1 WHERE id = OLD.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_reservas_contador_upd
+        AFTER UPDATE OF user_id ON Reservas
+        WHEN OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            UPDATE Users SET num_reservas = num_reservas - 1 WHERE id = OLD.user_id;
+            UPDATE Users SET num_reservas = num_reservas + 1 WHERE id = NEW.user_id;
+        END;
+    '''),
+    (7, 'Livro de equipamentos por reserva (estoque por data e período)', _livro_equipamentos),
+    # Reservas.equipamentos (texto) deixa de ser escrito; o livro é a fonte única
+    (8, 'ReservaEquipamento como fonte única dos equipamentos da reserva', _normalizar_equipamentos),
+    (9, 'Séries de reservas recorrentes', '''
+        CREATE TABLE IF NOT EXISTS SerieReserva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            matricula TEXT NOT NULL,
+            setor_id INTEGER NOT NULL,
+            sala_id INTEGER NOT NULL,
+            periodo TEXT NOT NULL,
+            regra TEXT NOT NULL CHECK(regra IN ('semanal', 'quinzenal', 'datas')),
+            data_inicio DATE NOT NULL,
+            data_fim DATE NOT NULL,
+            user_id INTEGER,
+            criada_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (setor_id) REFERENCES Setor(id),
+            FOREIGN KEY (sala_id) REFERENCES Sala(id),
+            FOREIGN KEY (user_id) REFERENCES Users(id)
+        );
+
+        -- Ocorrências avulsas têm serie_id NULL
+        ALTER TABLE Reservas ADD COLUMN serie_id INTEGER REFERENCES SerieReserva(id) ON DELETE SET NULL;
+        CREATE INDEX IF NOT EXISTS idx_reservas_serie ON Reservas (serie_id, data);
+    '''),
+    (10, 'AuditLog com alvo genérico e índices por alvo e por tempo', '''
+        -- Eventos de reservas, equipamentos e séries não têm usuário alvo;
+        -- target_username fica vazio e o alvo vai em (alvo_tipo, alvo_id)
+        ALTER TABLE AuditLog ADD COLUMN alvo_tipo TEXT;
+        ALTER TABLE AuditLog ADD COLUMN alvo_id INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_auditlog_alvo ON AuditLog (alvo_tipo, alvo_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_auditlog_timestamp ON AuditLog (timestamp);
+    '''),
+    # Captura de alterações para os backups incrementais (backup_data.py);
+    # AuditLog só recebe inserções e é exportado pelo id
+    (11, 'Registro de alterações por linha para backups incrementais', '''
+        CREATE TABLE IF NOT EXISTS Alteracoes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            operacao TEXT NOT NULL CHECK(operacao IN ('I', 'U', 'D')),
+            chave TEXT NOT NULL
+        );
+    ''' + ''.join(_triggers_alteracoes(tabela, chave) for tabela, chave in TABELAS_ALTERACOES)),
+    (12, 'Registro de alterações só enquanto houver uma base de backup', _captura_com_base),
+]
+
+
+# Incrementar ao mudar as tabelas base ou as sementes de database.criar_tabelas()
+REVISAO_BASE = 1
+
+
+def assinatura_esquema():
+    """Inteiro de 31 bits que muda com as tabelas base e com a lista de migrações;
+    guardado em PRAGMA user_version depois da inicialização completa"""
+    return zlib.crc32(repr((REVISAO_BASE, [(v, d) for v, d, _ in MIGRACOES])).encode('utf-8')) & 0x7FFFFFFF
+
+
+def _criar_tabela_versao(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def versao_atual(cursor):
+    cursor.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version')
+    return cursor.fetchone()[0]
+
+
+def migracoes_pendentes(cursor):
+    atual = versao_atual(cursor)
+    return [m for m in MIGRACOES if m[0] > atual]
+
+
+def _executar(cursor, passo):
+    if callable(passo):
+        passo(cursor)
+        return
+    # executescript faria COMMIT implícito; executa comando a comando
+    comando = ''
+    for linha in passo.splitlines(keepends=True):
+        comando += linha
+        if sqlite3.complete_statement(comando):
+            if comando.strip():
+                cursor.execute(comando)
+            comando = ''
+    if comando.strip():
+        cursor.execute(comando)
+
+
+def aplicar_migracoes(dry_run=False):
+    """Aplica as migrações pendentes; com dry_run apenas as lista"""
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        _criar_tabela_versao(cursor)
+        conn.commit()
+        pendentes = migracoes_pendentes(cursor)
+
+        if dry_run:
+            return [(versao, descricao) for versao, descricao, _ in pendentes]
+
+        aplicadas = []
+        for versao, descricao, passo in pendentes:
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Outro processo pode ter aplicado a migração enquanto esperávamos
+                if versao_atual(cursor) >= versao:
+                    cursor.execute('ROLLBACK')
+                    continue
+                _executar(cursor, passo)
+                cursor.execute('INSERT INTO schema_version (versao, descricao) VALUES (?, ?)',
+                               (versao, descricao))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            aplicadas.append((versao, descricao))
+            print(f"[OK] Migração {versao} aplicada: {descricao}")
+        return aplicadas
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv
+    resultado = aplicar_migracoes(dry_run=dry_run)
+    if dry_run:
+        if resultado:
+            print("[INFO] Migrações pendentes:")
+            for versao, descricao in resultado:
+                print(f"  - {versao}: {descricao}")
+        else:
+            print("[INFO] Nenhuma migração pendente.")
+    else:
+        print(f"[OK] {len(resultado)} migração(ões) aplicada(s).")
@@ -0,0 +1,437 @@
+"""
+Perfil das consultas SQL (opcional: SQL_PERFIL=1)
+
+As conexões abertas por database._abrir_conexao passam a ser
+ConexaoPerfilada: todo execute/executemany, inclusive o atalho
+conn.execute, usa um cursor que mede o tempo de execução e das leituras e
+conta as linhas devolvidas. O texto é normalizado (literais viram ?,
+listas de ? são encurtadas) e agrupado: chamadas, tempo total, p95, máximo e
+linhas. O set_trace_callback conta o que o SQLite executou de fato; o
+número passa do de chamadas quando há triggers ou BEGINs implícitos.
+
+Consultas acima de SQL_LENTA_MS vão para o registro de consultas lentas
+com o EXPLAIN QUERY PLAN, obtido numa conexão à parte, e as varreduras
+completas de tabela (SCAN sem índice) ficam destacadas. Cada processo grava
+o seu estado em SQL_PERFIL_DIR, com a geração das métricas (o master do
+gunicorn) no nome, e o apaga ao sair; o relatório soma os da geração.
+
+Uso: python perfil_sql.py [--top N] [--ordem total_ms|p95_ms|chamadas|linhas] [--lentas] [--geracao G]
+Página: /perfil_sql (admin, JSON)
+"""
+
+import atexit
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+import metricas
+
+SQL_PERFIL = os.environ.get('SQL_PERFIL') == '1'
+SQL_LENTA_MS = float(os.environ.get('SQL_LENTA_MS', 50))
+# Durações guardadas por consulta para o p95 (as mais recentes)
+SQL_PERFIL_AMOSTRAS = int(os.environ.get('SQL_PERFIL_AMOSTRAS', 512))
+SQL_PERFIL_LENTAS = int(os.environ.get('SQL_PERFIL_LENTAS', 200))
+SQL_PERFIL_INTERVALO = float(os.environ.get('SQL_PERFIL_INTERVALO', 10))
+# Mesmo diretório dos retratos de métricas: o master do gunicorn o limpa ao iniciar
+SQL_PERFIL_DIR = os.environ.get('SQL_PERFIL_DIR', metricas.METRICAS_DIR or
+                                os.path.join(tempfile.gettempdir(), 'ses-metricas'))
+EXPLICAVEIS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_lock = threading.Lock()
+_pid = None
+_thread = None
+_parar = False
+_lock_arquivo = threading.Lock()
+_consultas = {}  # consulta normalizada -> [chamadas, total_ms, max_ms, linhas, execucoes_sqlite, amostras]
+_lentas = deque(maxlen=SQL_PERFIL_LENTAS)
+_planos = {}  # consulta normalizada -> linhas do EXPLAIN QUERY PLAN
+_local = threading.local()
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\bX'[0-9A-Fa-f]*'|\b\d+(?:\.\d+)?\b|\bNULL\b")
+_TUPLAS = re.compile(r'\(\?(?:\s*,\s*\?)*\)(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))+')
+_LISTAS = re.compile(r'\?(?:\s*,\s*\?)+')
+_ESPACOS = re.compile(r'\s+')
+_VARREDURA = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)(?!.*\bUSING\b.*\bINDEX\b)')
+
+
+def normalizar(sql):
+    """Texto da consulta sem literais nem espaços repetidos, para agrupar as execuções"""
+    sql = _LITERAIS.sub('?', sql)
+    sql = _TUPLAS.sub(lambda m: m.group(0).split(')', 1)[0] + '), ...', sql)
+    sql = _LISTAS.sub('?, ...', sql)
+    return _ESPACOS.sub(' ', sql).strip()
+
+
+_normalizar_cache = lru_cache(maxsize=1024)(normalizar)
+
+
+def _verificar_fork():
+    global _pid, _thread, _parar, _consultas
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _thread = None
+        _parar = False
+        _consultas = {}
+        _lentas.clear()
+
+
+def _estatistica(chave):
+    estatistica = _consultas.get(chave)
+    if estatistica is None:
+        estatistica = _consultas[chave] = [0, 0.0, 0.0, 0, 0, deque(maxlen=SQL_PERFIL_AMOSTRAS)]
+    return estatistica
+
+
+def _rastrear(sql):
+    """set_trace_callback: cada comando executado pelo SQLite (com os valores já expandidos)"""
+    chave = normalizar(sql)
+    with _lock:
+        _verificar_fork()
+        _estatistica(chave)[4] += 1
+
+
+def registrar(sql, parametros, ms, linhas):
+    chave = _normalizar_cache(sql)
+    with _lock:
+        _verificar_fork()
+        estatistica = _estatistica(chave)
+        estatistica[0] += 1
+        estatistica[1] += ms
+        estatistica[2] = max(estatistica[2], ms)
+        estatistica[3] += linhas
+        estatistica[5].append(ms)
+    if _thread is None and SQL_PERFIL_DIR:
+        _iniciar()
+    if ms >= SQL_LENTA_MS:
+        _registrar_lenta(chave, sql, parametros, ms, linhas)
+
+
+def _conexao_explain():
+    # Conexão própria, sem perfil, por thread: o EXPLAIN não interfere na
+    # transação nem nos cursores abertos da conexão medida
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        from database import DATABASE
+        conn = _local.conn = sqlite3.connect(DATABASE, timeout=5.0)
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def _plano(chave, sql, parametros):
+    if chave in _planos:
+        return _planos[chave]
+    if chave.split(' ', 1)[0].upper() not in EXPLICAVEIS or parametros is None:
+        return None
+    # O plano não depende dos valores: os parâmetros vão como NULL
+    if isinstance(parametros, dict):
+        vazios = {nome: None for nome in parametros}
+    else:
+        vazios = [None] * len(parametros)
+    try:
+        linhas = _conexao_explain().execute('EXPLAIN QUERY PLAN ' + sql, vazios).fetchall()
+    except sqlite3.Error as e:
+        # Ex.: tabela criada na transação ainda não confirmada
+        return [f'indisponível: {e}']
+    profundidade = {}
+    plano = []
+    for id_no, pai, _, detalhe in linhas:
+        profundidade[id_no] = profundidade.get(pai, -1) + 1
+        plano.append('  ' * profundidade[id_no] + detalhe)
+    _planos[chave] = plano
+    return plano
+
+
+def varreduras(plano):
+    """Tabelas lidas por inteiro (SCAN sem índice): candidatas a um índice"""
+    return sorted({m.group(1) for linha in plano or () for m in [_VARREDURA.search(linha)] if m})
+
+
+def _registrar_lenta(chave, sql, parametros, ms, linhas):
+    plano = _plano(chave, sql, parametros)
+    tabelas = varreduras(plano)
+    with _lock:
+        _lentas.append({'quando': datetime.now().isoformat(timespec='seconds'), 'consulta': chave,
+                        'ms': round(ms, 2), 'linhas': linhas, 'plano': plano, 'varreduras': tabelas})
+    print(f"[SQL LENTA] {ms:.1f} ms, {linhas} linha(s): {chave[:300]}"
+          + (f" | SCAN sem índice: {', '.join(tabelas)}" if tabelas else ''))
+
+
+class CursorPerfilado(sqlite3.Cursor):
+    """Cursor que mede execute/executemany e as leituras do resultado"""
+
+    _sql = None
+
+    def _finalizar(self):
+        # Registra a execução anterior: ao esgotar o resultado, no próximo
+        # execute, no close ou quando o cursor é descartado
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        # Escritas não devolvem linhas: conta as afetadas
+        linhas = self._linhas if self.description is not None else max(self.rowcount, 0)
+        registrar(sql, self._parametros, self._ms, linhas)
+
+    def execute(self, sql, parametros=()):
+        self._finalizar()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self._sql, self._parametros, self._linhas = sql, parametros, 0
+            self._ms = (time.perf_counter() - inicio) * 1000
+
+    def executemany(self, sql, sequencia):
+        self._finalizar()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            self._sql, self._parametros, self._linhas = sql, None, 0
+            self._ms = (time.perf_counter() - inicio) * 1000
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = super().fetchone()
+        if self._sql is not None:
+            self._ms += (time.perf_counter() - inicio) * 1000
+            if linha is None:
+                self._finalizar()
+            else:
+                self._linhas += 1
+        return linha
+
+    def fetchmany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        linhas = super().fetchmany(*args, **kwargs)
+        if self._sql is not None:
+            self._ms += (time.perf_counter() - inicio) * 1000
+            self._linhas += len(linhas)
+            if not linhas:
+                self._finalizar()
+        return linhas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        linhas = super().fetchall()
+        if self._sql is not None:
+            self._ms += (time.perf_counter() - inicio) * 1000
+            self._linhas += len(linhas)
+            self._finalizar()
+        return linhas
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            linha = super().__next__()
+        except StopIteration:
+            if self._sql is not None:
+                self._ms += (time.perf_counter() - inicio) * 1000
+                self._finalizar()
+            raise
+        if self._sql is not None:
+            self._ms += (time.perf_counter() - inicio) * 1000
+            self._linhas += 1
+        return linha
+
+    def close(self):
+        self._finalizar()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finalizar()
+        except Exception:
+            pass
+
+
+class ConexaoPerfilada(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de conn.execute) são medidos"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_rastrear)
+
+    def cursor(self, factory=CursorPerfilado):
+        return super().cursor(factory)
+
+    # O atalho em C não passa por cursor(): sem isto escaparia da medição
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+
+def retrato():
+    with _lock:
+        _verificar_fork()
+        return {
+            'pid': os.getpid(),
+            'consultas': {chave: e[:5] + [list(e[5])] for chave, e in _consultas.items()},
+            'lentas': list(_lentas),
+            'planos': dict(_planos),
+        }
+
+
+def _arquivo():
+    # Mesma geração dos retratos de métricas: execuções anteriores e pids
+    # reaproveitados não entram no relatório
+    return os.path.join(SQL_PERFIL_DIR, f'sql-{metricas._geracao()}-{os.getpid()}.json')
+
+
+def gravar():
+    # Só os processos que registraram consultas (não o do relatório)
+    if not SQL_PERFIL_DIR or _thread is None or _pid != os.getpid():
+        return
+    with _lock_arquivo:
+        if _parar:
+            return
+        os.makedirs(SQL_PERFIL_DIR, exist_ok=True)
+        destino = _arquivo()
+        temporario = destino + '.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump(retrato(), arquivo)
+        os.replace(temporario, destino)
+
+
+def _laco():
+    while _pid == os.getpid() and not _parar:
+        time.sleep(SQL_PERFIL_INTERVALO)
+        try:
+            gravar()
+        except Exception as e:
+            print(f"Erro ao gravar o perfil SQL: {e}")
+
+
+def _iniciar():
+    global _thread
+    with _lock:
+        # A thread não sobrevive ao fork dos workers do gunicorn
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_laco, name='perfil-sql', daemon=True)
+        _thread.start()
+
+
+def encerrar():
+    """Para a gravação e apaga o retrato do processo (worker_exit / atexit)"""
+    global _parar
+    if _thread is None or _pid != os.getpid():
+        return
+    with _lock_arquivo:
+        _parar = True
+        try:
+            os.remove(_arquivo())
+        except OSError:
+            pass
+
+
+atexit.register(encerrar)
+
+
+def _geracao_recente():
+    """Geração do retrato gravado por último (relatório fora do gunicorn)"""
+    if not SQL_PERFIL_DIR or not os.path.isdir(SQL_PERFIL_DIR):
+        return None
+    arquivos = [nome for nome in os.listdir(SQL_PERFIL_DIR)
+                if nome.startswith('sql-') and nome.endswith('.json')]
+    if not arquivos:
+        return None
+    recente = max(arquivos, key=lambda nome: os.path.getmtime(os.path.join(SQL_PERFIL_DIR, nome)))
+    return recente.split('-')[1]
+
+
+def _retratos(geracao=None):
+    retratos = [retrato()]
+    if not SQL_PERFIL_DIR or not os.path.isdir(SQL_PERFIL_DIR):
+        return retratos
+    prefixo = f'sql-{geracao or metricas._geracao()}-'
+    for nome in os.listdir(SQL_PERFIL_DIR):
+        if not nome.startswith(prefixo) or not nome.endswith('.json') or nome == os.path.basename(_arquivo()):
+            continue
+        try:
+            with open(os.path.join(SQL_PERFIL_DIR, nome)) as arquivo:
+                retratos.append(json.load(arquivo))
+        except (OSError, ValueError):
+            continue
+    return retratos
+
+
+def _percentil(amostras, fracao):
+    if not amostras:
+        return 0.0
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, int(fracao * len(ordenadas)))]
+
+
+def relatorio(limite=20, ordem='total_ms', lentas=20, geracao=None):
+    """Top-N consultas somadas entre os processos, com as consultas lentas mais recentes"""
+    retratos = _retratos(geracao)
+    somadas, planos = {}, {}
+    for estado in retratos:
+        planos.update(estado['planos'])
+        for chave, (chamadas, total, maximo, linhas, sqlite, amostras) in estado['consultas'].items():
+            atual = somadas.setdefault(chave, [0, 0.0, 0.0, 0, 0, []])
+            atual[0] += chamadas
+            atual[1] += total
+            atual[2] = max(atual[2], maximo)
+            atual[3] += linhas
+            atual[4] += sqlite
+            atual[5].extend(amostras)
+
+    consultas = []
+    for chave, (chamadas, total, maximo, linhas, sqlite, amostras) in somadas.items():
+        plano = planos.get(chave)
+        consultas.append({
+            'consulta': chave,
+            'chamadas': chamadas,
+            'total_ms': round(total, 2),
+            'media_ms': round(total / chamadas, 3) if chamadas else 0.0,
+            'p95_ms': round(_percentil(amostras, 0.95), 3),
+            'max_ms': round(maximo, 2),
+            'linhas': linhas,
+            'execucoes_sqlite': sqlite,
+            'plano': plano,
+            'varreduras': varreduras(plano),
+        })
+    consultas.sort(key=lambda c: c.get(ordem, 0), reverse=True)
+
+    registro = sorted((e for estado in retratos for e in estado['lentas']),
+                      key=lambda e: e['quando'], reverse=True)
+    return {'ativo': SQL_PERFIL, 'lenta_ms': SQL_LENTA_MS, 'processos': len(retratos),
+            'consultas': consultas[:limite], 'lentas': registro[:lentas]}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Relatório do perfil SQL dos processos da aplicação')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--ordem', default='total_ms', choices=('total_ms', 'p95_ms', 'chamadas', 'linhas'))
+    parser.add_argument('--lentas', action='store_true', help='inclui o registro de consultas lentas')
+    parser.add_argument('--geracao', help='pid do master do gunicorn (padrão: a gravada por último)')
+    args = parser.parse_args()
+
+    geracao = args.geracao or _geracao_recente()
+    if geracao is None:
+        sys.exit(f"Nenhum retrato do perfil SQL em {SQL_PERFIL_DIR}")
+    dados = relatorio(args.top, args.ordem, geracao=geracao)
+    print(f"{dados['processos'] - 1} processo(s) com perfil em {SQL_PERFIL_DIR} (geração {geracao})")
+    print(f"{'chamadas':>9} {'total ms':>10} {'média ms':>9} {'p95 ms':>8} {'linhas':>8} {'sqlite':>7}  consulta")
+    for c in dados['consultas']:
+        print(f"{c['chamadas']:>9} {c['total_ms']:>10.1f} {c['media_ms']:>9.3f} {c['p95_ms']:>8.2f} "
+              f"{c['linhas']:>8} {c['execucoes_sqlite']:>7}  {c['consulta'][:120]}")
+        if c['varreduras']:
+            print(f"{'':>56}SCAN sem índice: {', '.join(c['varreduras'])}")
+    if args.lentas:
+        print(f"\nConsultas acima de {SQL_LENTA_MS:g} ms:")
+        for e in dados['lentas']:
+            print(f"{e['quando']}  {e['ms']:.1f} ms  {e['linhas']} linha(s)  {e['consulta'][:160]}")
+            for linha in e['plano'] or ():
+                print(f"    {linha}")
@@ -0,0 +1,30 @@
+"""
+Controle de acesso por cargo, compartilhado pelas páginas e pela API JSON
+"""
+
+from functools import wraps
+from flask import flash, jsonify, redirect, session, url_for
+
+
+# Decorator para verificar permissões
+def requer_cargo(cargos_permitidos, json=False):
+    """Restringe a rota aos cargos informados.
+
+    Nas páginas redireciona com uma mensagem; com json=True responde 401/403
+    em JSON, sem redirecionar."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'cargo' not in session:
+                if json:
+                    return jsonify({'erro': 'Autenticação necessária'}), 401
+                flash('Faça login para acessar esta página.', 'error')
+                return redirect(url_for('autenticacao.login'))
+            if session['cargo'] not in cargos_permitidos:
+                if json:
+                    return jsonify({'erro': 'Permissão negada'}), 403
+                flash('Você não tem permissão para acessar esta página.', 'error')
+                return redirect(url_for('index'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
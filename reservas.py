@@ -0,0 +1,216 @@
+"""
+Blueprint de reservas: agendamento (único ou em série), edição e exclusão.
+
+As escritas passam pela thread de escrita (escrita.executar); o conflito
+de horário é rejeitado pelo próprio banco (OcupacaoSala).
+"""
+
+from flask import Blueprint, flash, g, jsonify, redirect, render_template, request, session, url_for
+from database import (conectar, conexao, conflito_de_ocupacao, equipamentos_da_reserva, EscritaRecusada,
+                      inserir_reserva, atualizar_reserva, excluir_reserva)
+import escrita
+import series
+from permissoes import requer_cargo
+from respostas import responder_com_etag
+
+reservas = Blueprint('reservas', __name__)
+
+
+@reservas.route('/agendar', methods=['GET', 'POST'])
+@requer_cargo(['admin', 'cotead', 'colaborador'])
+def agendar_sala():
+    if session.get('cargo') == '':
+        flash('Apenas Usuários podem agendar salas.', 'info')
+        return redirect(url_for('index'))
+
+    if request.method == 'POST':
+        try:
+            nome = request.form['nome']
+            matricula = request.form['matricula']
+            setor_id = request.form['setor_id']
+            sala_id = request.form['sala_id']
+            data = request.form['data']
+            periodo = request.form['periodo']
+            equipamentos = request.form.getlist('equipamentos', type=int)
+
+            usuario_logado = session.get('user_id')  #pegando usuario logado
+
+            recorrencia = request.form.get('recorrencia', 'unica')
+            if recorrencia != 'unica':
+                return _agendar_serie(recorrencia, nome, matricula, setor_id, sala_id, data,
+                                      periodo, equipamentos, usuario_logado)
+
+            # Gravação pela thread de escrita (BEGIN IMMEDIATE); o conflito de
+            # horário é rejeitado pelo próprio banco (OcupacaoSala)
+            g.auditoria = {'alvo_id': escrita.executar(inserir_reserva, nome, matricula, setor_id, sala_id,
+                                                       data, periodo, usuario_logado, equipamentos)}
+            flash('Reserva efetuada com sucesso!', 'success')
+
+        except EscritaRecusada as e:
+            flash(str(e), 'error')
+            return redirect(url_for('reservas.agendar_sala'))
+        except Exception as e:
+            if conflito_de_ocupacao(e):
+                flash('Esta sala já está reservada para este período.', 'error')
+                return redirect(url_for('reservas.agendar_sala'))
+            flash(f'Erro ao realizar reserva: {str(e)}', 'error')
+
+        return redirect(url_for('calendario.agenda'))
+
+    # Carregar dados para o formulário (304 enquanto salas e equipamentos não mudarem)
+    def gerar(versoes):
+        try:
+            conn = conectar()
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM Equipamentos WHERE quantidade > 0')
+            equipamentos = cursor.fetchall()
+
+            cursor.execute('SELECT * FROM Sala')
+            salas = cursor.fetchall()
+
+            return render_template('agendar_sala.html',
+                                 equipamentos=equipamentos,
+                                 salas=salas)
+        except Exception as e:
+            flash(f'Erro ao carregar dados: {str(e)}', 'error')
+            return redirect(url_for('index'))
+        finally:
+            if 'conn' in locals():
+                conn.close()
+
+    return responder_com_etag(('Sala', 'Equipamentos'), gerar)
+
+
+def _agendar_serie(regra, nome, matricula, setor_id, sala_id, data, periodo, equipamentos, usuario_logado):
+    """Reserva recorrente: todas as ocorrências livres numa única transação,
+    com o resultado de cada data no relatório"""
+    datas = [data] + request.form.get('datas', '').split()
+    try:
+        datas = series.expandir_datas(regra, data, request.form.get('data_fim') or None, datas)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reservas.agendar_sala'))
+
+    serie_id, relatorio = series.criar_serie(nome, matricula, setor_id, sala_id, periodo, regra, datas,
+                                             usuario_logado, equipamentos,
+                                             request.form.get('data_fim') or None)
+    reservadas = sum(1 for _, situacao, _ in relatorio if situacao == 'reservada')
+    g.auditoria = {'serie_id': serie_id, 'reservadas': reservadas}
+
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'serie_id': serie_id,
+            'reservadas': reservadas,
+            'ocorrencias': [{'data': d, 'situacao': situacao, 'detalhe': detalhe}
+                            for d, situacao, detalhe in relatorio],
+        }), 201 if serie_id else 409
+
+    if serie_id:
+        flash(f'{reservadas} de {len(relatorio)} ocorrência(s) reservada(s).', 'success')
+    else:
+        flash('Nenhuma ocorrência pôde ser reservada.', 'error')
+    serie, ocorrencias = series.buscar_serie(serie_id) if serie_id else (None, [])
+    return render_template('serie.html', serie=serie, ocorrencias=ocorrencias,
+                           relatorio=relatorio, salas=_salas())
+
+
+def _salas():
+    with conexao() as conn:
+        return conn.execute('SELECT id, nome FROM Sala ORDER BY id').fetchall()
+
+
+@reservas.route('/series/<int:id>')
+@requer_cargo(['admin', 'cotead', 'colaborador'])
+def ver_serie(id):
+    serie, ocorrencias = series.buscar_serie(id)
+    if not serie:
+        flash('Série não encontrada.', 'error')
+        return redirect(url_for('calendario.agenda'))
+    return render_template('serie.html', serie=serie, ocorrencias=ocorrencias,
+                           relatorio=None, salas=_salas())
+
+
+@reservas.route('/series/<int:id>/editar', methods=['POST'])
+@requer_cargo(['admin'])
+def editar_serie(id):
+    try:
+        ok, mensagem, datas = series.editar_serie(id, request.form['nome'], request.form['matricula'],
+                                                  request.form['setor_id'], request.form['sala_id'],
+                                                  request.form['periodo'])
+        if not ok and datas:
+            mensagem += ': ' + ', '.join(datas)
+        flash(mensagem + '.', 'success' if ok else 'error')
+    except Exception as e:
+        print(f"Erro ao atualizar série: {e}")
+        flash('Erro ao atualizar série.', 'error')
+    return redirect(url_for('reservas.ver_serie', id=id))
+
+
+@reservas.route('/series/<int:id>/cancelar')
+@requer_cargo(['admin'])
+def cancelar_serie(id):
+    try:
+        canceladas = series.cancelar_serie(id)
+        flash(f'{canceladas} ocorrência(s) cancelada(s).', 'success')
+    except Exception as e:
+        print(f"Erro ao cancelar série: {e}")
+        flash('Erro ao cancelar série.', 'error')
+    return redirect(url_for('usuarios.admin_dashboard'))
+
+
+@reservas.route('/deletar/<int:id>')
+@requer_cargo(['admin'])
+def deletar_reserva(id):
+    try:
+        escrita.executar(excluir_reserva, id)
+        flash('Reserva excluída com sucesso!', 'success')
+    except Exception as e:
+        print(f"Erro ao deletar reserva: {e}")
+        flash('Erro ao excluir reserva.', 'error')
+
+    return redirect(url_for('usuarios.admin_dashboard'))
+
+
+@reservas.route('/editar/<int:id>', methods=['GET', 'POST'])
+@requer_cargo(['admin'])
+def editar_reserva(id):
+    if request.method == 'POST':
+        nome = request.form['nome']
+        matricula = request.form['matricula']
+        setor_id = request.form['setor_id']
+        sala_id = request.form['sala_id']
+        data = request.form['data']
+        periodo = request.form['periodo']
+        equipamentos = request.form.getlist('equipamentos', type=int)
+
+        try:
+            escrita.executar(atualizar_reserva, id, nome, matricula, setor_id, sala_id, data, periodo,
+                             equipamentos)
+            flash('Reserva atualizada com sucesso!', 'success')
+        except EscritaRecusada as e:
+            flash(str(e), 'error')
+            return redirect(url_for('reservas.editar_reserva', id=id))
+        except Exception as e:
+            if conflito_de_ocupacao(e):
+                flash('Esta sala já está reservada para este período.', 'error')
+                return redirect(url_for('reservas.editar_reserva', id=id))
+            print(f"Erro ao atualizar reserva: {e}")
+            flash('Erro ao atualizar reserva.', 'error')
+
+        return redirect(url_for('usuarios.admin_dashboard'))
+
+    # Carregar dados da reserva para edição (304 enquanto reservas e equipamentos não mudarem)
+    def gerar(versoes):
+        cursor.execute('SELECT * FROM Reservas WHERE id = ?', (id,))
+        reserva = cursor.fetchone()
+
+        equipamentos = equipamentos_da_reserva(cursor, id)
+
+        return render_template('editar_reserva.html', reserva=reserva, equipamentos=equipamentos)
+
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        return responder_com_etag(('Reservas', 'Equipamentos', 'ReservaEquipamento'), gerar, id)
+    finally:
+        conn.close()
@@ -0,0 +1,48 @@
+"""
+Utilitários compartilhados pelos blueprints das páginas: respostas
+condicionais (ETag derivado das versões dos dados) e parâmetros de data
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from flask import current_app, make_response, request, session
+from database import estado_dados
+
+# Identifica a versão publicada; templates novos invalidam os ETags antigos
+VERSAO_APP = os.environ.get('RENDER_GIT_COMMIT') or str(int(datetime.now().timestamp()))
+
+
+def responder_com_etag(tabelas, gerar, *chave):
+    """Responde 304 quando o cliente já tem a versão atual das tabelas envolvidas.
+
+    O ETag é forte e derivado das versões de dados (VersaoDados), do endpoint,
+    do usuário da sessão e de qualquer chave extra (filtros, ids)."""
+    if session.get('_flashes'):
+        # Mensagens pendentes só aparecem numa página renderizada de novo
+        return gerar(None)
+
+    versoes, alterado_em = estado_dados(*tabelas)
+    identidade = repr((VERSAO_APP, request.endpoint, session.get('username'), chave))
+    etag = '-'.join(map(str, versoes)) + '-' + hashlib.sha1(identidade.encode('utf-8')).hexdigest()[:16]
+
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = make_response(gerar(versoes))
+        if resp.status_code != 200:
+            return resp
+    resp.set_etag(etag)
+    if alterado_em:
+        resp.last_modified = alterado_em.replace(tzinfo=timezone.utc)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def data_parametro(nome):
+    """Lê um parâmetro de data ISO da query string (aceita data-hora do FullCalendar)"""
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    return datetime.strptime(valor[:10], '%Y-%m-%d').date().isoformat()
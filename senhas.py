@@ -0,0 +1,90 @@
+"""
+Política de hash de senhas e verificação fora da thread da requisição
+
+O scrypt do Werkzeug custa dezenas de milissegundos e bastante memória por
+verificação; aqui ela roda num pool de processos limitado, e hashes gerados
+com parâmetros antigos são refeitos de forma transparente no login.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Método no formato do Werkzeug, ex.: 'scrypt:32768:8:1' ou 'pbkdf2:sha256:600000'
+SENHA_METODO = os.environ.get('SENHA_METODO', 'scrypt:32768:8:1')
+# Processos dedicados à verificação (0 verifica na própria thread)
+SENHA_PROCESSOS = int(os.environ.get('SENHA_PROCESSOS', 1))
+# Verificações simultâneas permitidas; as demais aguardam a vez
+SENHA_CONCORRENCIA = int(os.environ.get('SENHA_CONCORRENCIA', 2))
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_semaforo = threading.BoundedSemaphore(SENHA_CONCORRENCIA)
+_prefixos = {}
+
+
+def gerar_hash(senha, metodo=None):
+    return generate_password_hash(senha, method=metodo or SENHA_METODO)
+
+
+def prefixo_politica(metodo=None):
+    """Prefixo que os hashes gerados com o método configurado carregam"""
+    metodo = metodo or SENHA_METODO
+    if metodo not in _prefixos:
+        # O Werkzeug completa parâmetros omitidos (ex.: iterações do pbkdf2)
+        _prefixos[metodo] = gerar_hash('', metodo).split('$', 1)[0]
+    return _prefixos[metodo]
+
+
+def precisa_rehash(password_hash, metodo=None):
+    return password_hash.split('$', 1)[0] != prefixo_politica(metodo)
+
+
+def _verificar(password_hash, senha, metodo):
+    """Executado no processo de verificação: confere a senha e refaz o hash se preciso"""
+    if not check_password_hash(password_hash, senha):
+        return False, None
+    if precisa_rehash(password_hash, metodo):
+        return True, gerar_hash(senha, metodo)
+    return True, None
+
+
+def _obter_executor():
+    global _executor, _executor_pid
+    with _lock:
+        # O pool não sobrevive ao fork dos workers do gunicorn
+        if _executor is None or _executor_pid != os.getpid():
+            metodos = multiprocessing.get_all_start_methods()
+            contexto = multiprocessing.get_context('fork' if 'fork' in metodos else 'spawn')
+            _executor = ProcessPoolExecutor(max_workers=SENHA_PROCESSOS, mp_context=contexto)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def iniciar():
+    """Sobe os processos de verificação (chamar logo após o fork do worker,
+    enquanto ele ainda tem uma única thread)"""
+    if SENHA_PROCESSOS > 0:
+        executor = _obter_executor()
+        for futuro in [executor.submit(os.getpid) for _ in range(SENHA_PROCESSOS)]:
+            futuro.result()
+
+
+def verificar(password_hash, senha, metodo=None):
+    """Retorna (senha_confere, novo_hash); novo_hash só vem quando a política mudou"""
+    metodo = metodo or SENHA_METODO
+    with _semaforo:
+        if SENHA_PROCESSOS <= 0:
+            return _verificar(password_hash, senha, metodo)
+        return _obter_executor().submit(_verificar, password_hash, senha, metodo).result()
+
+
+def encerrar():
+    global _executor
+    with _lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,244 @@
+"""
+Reservas recorrentes (séries): expansão das ocorrências, checagem de
+conflitos em lote e gravação de todas as ocorrências numa única transação
+(uma unidade da thread de escrita)
+"""
+
+import os
+from datetime import date, datetime, timedelta
+import escrita
+from database import conectar
+
+REGRAS = {'semanal': 7, 'quinzenal': 14}
+# Limite de ocorrências por série (um ano de reservas semanais com folga)
+MAX_OCORRENCIAS = int(os.environ.get('SERIE_MAX_OCORRENCIAS', 60))
+
+
+def _data(valor):
+    return datetime.strptime(valor.strip()[:10], '%Y-%m-%d').date()
+
+
+def expandir_datas(regra, data_inicio, data_fim=None, datas=None):
+    """Lista ordenada (ISO) das datas da série.
+
+    regra 'semanal'/'quinzenal' repete data_inicio até data_fim; regra
+    'datas' usa a lista explícita (limitada a data_fim, se informada)."""
+    if regra in REGRAS:
+        if not data_fim:
+            raise ValueError('Informe a data final da série')
+        inicio, fim = _data(data_inicio), _data(data_fim)
+        if fim < inicio:
+            raise ValueError('A data final deve ser posterior à inicial')
+        ocorrencias = []
+        atual = inicio
+        while atual <= fim:
+            ocorrencias.append(atual)
+            atual += timedelta(days=REGRAS[regra])
+    elif regra == 'datas':
+        ocorrencias = sorted({_data(d) for d in (datas or []) if d.strip()})
+        if data_fim:
+            ocorrencias = [d for d in ocorrencias if d <= _data(data_fim)]
+    else:
+        raise ValueError('Regra de recorrência inválida')
+
+    if not ocorrencias:
+        raise ValueError('A série não tem nenhuma ocorrência')
+    if len(ocorrencias) > MAX_OCORRENCIAS:
+        raise ValueError(f'A série excede o limite de {MAX_OCORRENCIAS} ocorrências')
+    return [d.isoformat() for d in ocorrencias]
+
+
+def _datas_ocupadas(cursor, sala_id, periodo, datas, ignorar_serie=None):
+    """Uma única consulta: quais datas já têm algum turno do período ocupado"""
+    valores = ', '.join('(?)' for _ in datas)
+    parametros = list(datas) + [sala_id, periodo]
+    filtro_serie = ''
+    if ignorar_serie is not None:
+        filtro_serie = 'AND o.reserva_id NOT IN (SELECT id FROM Reservas WHERE serie_id = ?)'
+        parametros.append(ignorar_serie)
+    cursor.execute(f'''
+        WITH candidatas(data) AS (VALUES {valores})
+        SELECT DISTINCT o.data
+        FROM OcupacaoSala o
+        JOIN candidatas c ON c.data = o.data
+        WHERE o.sala_id = ?
+          AND o.turno IN (SELECT turno FROM PeriodoTurno WHERE periodo = ?)
+          {filtro_serie}
+    ''', parametros)
+    return {linha[0] for linha in cursor.fetchall()}
+
+
+def _datas_sem_equipamento(cursor, serie_id, periodo):
+    """Datas da série em que algum equipamento escolhido ficou acima do estoque"""
+    cursor.execute('''
+        SELECT uso.data, e.nome
+        FROM (
+            SELECT r.data, pt.turno, re.equipamento_id, SUM(re.quantidade) AS total
+            FROM Reservas r
+            JOIN ReservaEquipamento re ON re.reserva_id = r.id
+            JOIN PeriodoTurno pt ON pt.periodo = r.periodo
+            WHERE r.data IN (SELECT data FROM Reservas WHERE serie_id = ?)
+              AND pt.turno IN (SELECT turno FROM PeriodoTurno WHERE periodo = ?)
+              AND re.equipamento_id IN (
+                  SELECT re2.equipamento_id FROM ReservaEquipamento re2
+                  JOIN Reservas r2 ON r2.id = re2.reserva_id
+                  WHERE r2.serie_id = ?)
+            GROUP BY r.data, pt.turno, re.equipamento_id
+        ) uso
+        JOIN Equipamentos e ON e.id = uso.equipamento_id
+        WHERE uso.total > e.quantidade
+    ''', (serie_id, periodo, serie_id))
+    faltas = {}
+    for data, nome in cursor.fetchall():
+        faltas.setdefault(data, set()).add(nome)
+    return faltas
+
+
+def criar_serie(nome, matricula, setor_id, sala_id, periodo, regra, datas,
+                user_id, equipamento_ids=(), data_fim=None):
+    """Cria a série e todas as ocorrências livres numa única transação.
+
+    Retorna (serie_id, relatorio), onde relatorio é uma lista de
+    (data, situacao, detalhe) com situacao 'reservada', 'conflito' ou
+    'equipamento'. serie_id é None quando nenhuma ocorrência foi gravada."""
+    equipamento_ids = sorted({int(e) for e in equipamento_ids})
+    return escrita.executar(_criar_serie, nome, matricula, setor_id, sala_id, periodo, regra, datas,
+                            user_id, equipamento_ids, data_fim)
+
+
+def _criar_serie(cursor, nome, matricula, setor_id, sala_id, periodo, regra, datas,
+                 user_id, equipamento_ids, data_fim):
+    ocupadas = _datas_ocupadas(cursor, sala_id, periodo, datas)
+    livres = [d for d in datas if d not in ocupadas]
+
+    relatorio = {d: (d, 'conflito', 'Sala já reservada neste período') for d in ocupadas}
+    serie_id = None
+    if livres:
+        cursor.execute('''
+            INSERT INTO SerieReserva (nome, matricula, setor_id, sala_id, periodo, regra,
+                                      data_inicio, data_fim, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (nome, matricula, setor_id, sala_id, periodo, regra,
+              datas[0], data_fim or datas[-1], user_id))
+        serie_id = cursor.lastrowid
+
+        cursor.executemany('''
+            INSERT INTO Reservas (nome, matricula, setor_id, sala_id, data, periodo, user_id, serie_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(nome, matricula, setor_id, sala_id, d, periodo, user_id, serie_id) for d in livres])
+
+        if equipamento_ids:
+            cursor.execute(f'''
+                INSERT INTO ReservaEquipamento (reserva_id, equipamento_id, quantidade)
+                SELECT r.id, e.id, 1
+                FROM Reservas r, Equipamentos e
+                WHERE r.serie_id = ? AND e.id IN ({', '.join('?' * len(equipamento_ids))})
+            ''', [serie_id] + equipamento_ids)
+
+            faltas = _datas_sem_equipamento(cursor, serie_id, periodo)
+            if faltas:
+                cursor.executemany('DELETE FROM Reservas WHERE serie_id = ? AND data = ?',
+                                   [(serie_id, d) for d in faltas])
+                for d, nomes in faltas.items():
+                    relatorio[d] = (d, 'equipamento',
+                                    f'Equipamento indisponível: {", ".join(sorted(nomes))}')
+
+        for d in livres:
+            relatorio.setdefault(d, (d, 'reservada', 'Reserva efetuada'))
+
+        if all(situacao != 'reservada' for _, situacao, _ in relatorio.values()):
+            cursor.execute('DELETE FROM SerieReserva WHERE id = ?', (serie_id,))
+            serie_id = None
+
+    return serie_id, [relatorio[d] for d in datas]
+
+
+def buscar_serie(serie_id):
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT id, nome, matricula, setor_id, sala_id, periodo, regra, data_inicio, data_fim, user_id
+            FROM SerieReserva WHERE id = ?
+        ''', (serie_id,))
+        serie = cursor.fetchone()
+        if not serie:
+            return None, []
+        cursor.execute('''
+            SELECT r.id, r.data, r.periodo, s.nome
+            FROM Reservas r
+            JOIN Sala s ON s.id = r.sala_id
+            WHERE r.serie_id = ?
+            ORDER BY r.data
+        ''', (serie_id,))
+        return serie, cursor.fetchall()
+    finally:
+        conn.close()
+
+
+class _SerieRecusada(Exception):
+    def __init__(self, mensagem, datas):
+        super().__init__(mensagem)
+        self.datas = datas
+
+
+def editar_serie(serie_id, nome, matricula, setor_id, sala_id, periodo, a_partir_de=None):
+    """Altera todas as ocorrências da série a partir de uma data (padrão: hoje).
+
+    A troca de sala ou período é atômica: se qualquer ocorrência colidir, nada
+    é alterado e as datas em conflito são devolvidas."""
+    a_partir_de = a_partir_de or date.today().isoformat()
+    try:
+        alteradas = escrita.executar(_editar_serie, serie_id, nome, matricula, setor_id, sala_id,
+                                     periodo, a_partir_de)
+    except _SerieRecusada as e:
+        return False, str(e), e.datas
+    return True, f'{alteradas} ocorrência(s) atualizada(s)', []
+
+
+def _editar_serie(cursor, serie_id, nome, matricula, setor_id, sala_id, periodo, a_partir_de):
+    cursor.execute('SELECT data FROM Reservas WHERE serie_id = ? AND data >= ?',
+                   (serie_id, a_partir_de))
+    datas = [linha[0] for linha in cursor.fetchall()]
+    if not datas:
+        raise _SerieRecusada('A série não tem ocorrências futuras', [])
+
+    conflitos = sorted(_datas_ocupadas(cursor, sala_id, periodo, datas, ignorar_serie=serie_id))
+    if conflitos:
+        raise _SerieRecusada('Sala já reservada em algumas datas da série', conflitos)
+
+    cursor.execute('''
+        UPDATE Reservas
+        SET nome = ?, matricula = ?, setor_id = ?, sala_id = ?, periodo = ?
+        WHERE serie_id = ? AND data >= ?
+    ''', (nome, matricula, setor_id, sala_id, periodo, serie_id, a_partir_de))
+    alteradas = cursor.rowcount
+
+    faltas = _datas_sem_equipamento(cursor, serie_id, periodo)
+    if faltas:
+        raise _SerieRecusada('Equipamento indisponível em algumas datas da série', sorted(faltas))
+
+    cursor.execute('''
+        UPDATE SerieReserva
+        SET nome = ?, matricula = ?, setor_id = ?, sala_id = ?, periodo = ?
+        WHERE id = ?
+    ''', (nome, matricula, setor_id, sala_id, periodo, serie_id))
+    return alteradas
+
+
+def cancelar_serie(serie_id, a_partir_de=None):
+    """Exclui as ocorrências da série a partir de uma data (padrão: hoje);
+    a série some quando não sobra nenhuma ocorrência"""
+    a_partir_de = a_partir_de or date.today().isoformat()
+    return escrita.executar(_cancelar_serie, serie_id, a_partir_de)
+
+
+def _cancelar_serie(cursor, serie_id, a_partir_de):
+    cursor.execute('DELETE FROM Reservas WHERE serie_id = ? AND data >= ?',
+                   (serie_id, a_partir_de))
+    canceladas = cursor.rowcount
+    cursor.execute('''
+        DELETE FROM SerieReserva
+        WHERE id = ? AND NOT EXISTS (SELECT 1 FROM Reservas WHERE serie_id = ?)
+    ''', (serie_id, serie_id))
+    return canceladas
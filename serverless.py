@@ -0,0 +1,98 @@
+"""
+Execução serverless (api/index.py)
+
+O estado de módulo (aplicação, pool de conexões, caches) é reaproveitado
+pelas invocações quentes da mesma instância. O banco fica em /tmp, copiado
+uma única vez por instância do banco semente empacotado com o código
+(database.DATABASE_SEMENTE), e só é preparado na primeira requisição que o
+usa (APP_BANCO_PREGUICOSO). Cada resposta informa no cabeçalho
+Server-Timing se a invocação foi fria ou quente; os totais aparecem em
+/health (serverless).
+"""
+
+import os
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+
+def configurar_ambiente():
+    """Padrões do modo serverless; chamar antes de importar database/app"""
+    os.environ.setdefault('DATABASE_PATH', '/tmp/salas.db')
+    semente = os.path.join(RAIZ, 'salas.db')
+    if os.path.exists(semente):
+        os.environ.setdefault('DATABASE_SEMENTE', semente)
+    os.environ.setdefault('APP_BANCO_PREGUICOSO', '1')
+    # Uma instância atende poucas requisições simultâneas
+    os.environ.setdefault('DB_POOL_TAMANHO', '2')
+    # Verificação de senha na própria thread: o pool de processos precisa de
+    # /dev/shm, que nem todo ambiente serverless oferece
+    os.environ.setdefault('SENHA_PROCESSOS', '0')
+    # Um processo por instância: /metrics lê o próprio estado, sem retratos em disco
+    os.environ.setdefault('METRICAS_DIR', '')
+
+
+class MedidorInvocacoes:
+    """Middleware WSGI: separa a latência das invocações frias das quentes"""
+
+    def __init__(self, wsgi_app, inicio_instancia):
+        self.wsgi_app = wsgi_app
+        # Do início do import do módulo de entrada até a aplicação montada
+        self.import_ms = round((time.perf_counter() - inicio_instancia) * 1000, 2)
+        self._lock = threading.Lock()
+        self._metricas = {'invocacoes': 0, 'fria_ms': None, 'quentes': 0,
+                          'quente_ms_total': 0.0, 'quente_ms_max': 0.0}
+
+    def _registrar(self, duracao):
+        with self._lock:
+            self._metricas['invocacoes'] += 1
+            fria = self._metricas['fria_ms'] is None
+            if fria:
+                self._metricas['fria_ms'] = round(duracao, 2)
+            else:
+                self._metricas['quentes'] += 1
+                self._metricas['quente_ms_total'] += duracao
+                self._metricas['quente_ms_max'] = max(self._metricas['quente_ms_max'], duracao)
+        return fria
+
+    def __call__(self, environ, start_response):
+        inicio = time.perf_counter()
+
+        def iniciar_resposta(status, cabecalhos, exc_info=None):
+            duracao = (time.perf_counter() - inicio) * 1000
+            if self._registrar(duracao):
+                cabecalhos.append(('Server-Timing',
+                                   f'fria;dur={duracao:.1f}, import;dur={self.import_ms:.1f}'))
+                print(f'[SERVERLESS] invocação fria: import {self.import_ms} ms, '
+                      f'requisição {duracao:.1f} ms ({environ.get("PATH_INFO")})')
+            else:
+                cabecalhos.append(('Server-Timing', f'quente;dur={duracao:.1f}'))
+            return start_response(status, cabecalhos, exc_info)
+
+        resposta = self.wsgi_app(environ, iniciar_resposta)
+        # A instância pode ser congelada ou descartada logo após a resposta:
+        # a auditoria pendente é gravada antes, em vez de esperar a thread
+        import auditoria
+        if auditoria.estatisticas()['pendentes']:
+            auditoria.descarregar()
+        return resposta
+
+    def estatisticas(self):
+        with self._lock:
+            quentes = self._metricas['quentes']
+            return {
+                'import_ms': self.import_ms,
+                'invocacoes': self._metricas['invocacoes'],
+                'fria_ms': self._metricas['fria_ms'],
+                'quentes': quentes,
+                'quente_ms_media': round(self._metricas['quente_ms_total'] / quentes, 2) if quentes else None,
+                'quente_ms_max': round(self._metricas['quente_ms_max'], 2),
+            }
+
+
+def instalar(app, inicio_instancia):
+    medidor = MedidorInvocacoes(app.wsgi_app, inicio_instancia)
+    app.wsgi_app = medidor
+    app.extensions['serverless'] = medidor
+    return medidor
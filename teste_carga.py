@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Teste de carga contra um servidor em execução
+Cada cliente faz login uma vez e repete uma mistura de páginas e consultas
+JSON; mede requisições/segundo e latências (p50/p95/p99)
+
+Uso: python teste_carga.py [url] [clientes] [segundos]
+Ex.: GUNICORN_MODO=gthread gunicorn -c gunicorn.conf.py app:app &
+     python teste_carga.py http://127.0.0.1:5000 16 20
+"""
+
+import http.cookiejar
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+USUARIO = os.environ.get('CARGA_USUARIO', 'admin@ses')
+SENHA = os.environ.get('CARGA_SENHA', 'SES@admin2024')
+
+# (caminho, peso) — o feed do calendário domina o tráfego real; o login
+# (POST com verificação scrypt) é a requisição lenta que travava o worker sync
+ROTEIRO = [
+    ('/login', 1),
+    ('/get_reservas?start=2024-01-01&end=2026-12-31', 16),
+    ('/agenda', 8),
+    ('/api/v1/reservas?limite=50', 8),
+    ('/admin_dashboard', 4),
+    ('/health', 4),
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def cliente(base, fim):
+    abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    dados = urllib.parse.urlencode({'username': USUARIO, 'password': SENHA}).encode()
+    abridor.open(base + '/login', dados, timeout=60).read()
+
+    caminhos = [caminho for caminho, peso in ROTEIRO for _ in range(peso)]
+    latencias = {caminho: [] for caminho, _ in ROTEIRO}
+    erros, i = 0, 0
+    while time.perf_counter() < fim:
+        caminho = caminhos[i % len(caminhos)]
+        inicio = time.perf_counter()
+        try:
+            with abridor.open(base + caminho, dados if caminho == '/login' else None, timeout=60) as resposta:
+                resposta.read()
+        except Exception:
+            erros += 1
+        latencias[caminho].append(time.perf_counter() - inicio)
+        i += 1
+    return latencias, erros
+
+
+if __name__ == '__main__':
+    base = sys.argv[1].rstrip('/') if len(sys.argv) > 1 else 'http://127.0.0.1:5000'
+    clientes = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    duracao = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+
+    print(f"[INFO] {clientes} clientes por {duracao:.0f}s contra {base}")
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        fim = time.perf_counter() + duracao
+        resultados = list(pool.map(lambda _: cliente(base, fim), range(clientes)))
+
+    erros = sum(e for _, e in resultados)
+    print(f"{'caminho':<48} {'req':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    todas = []
+    for caminho, _ in ROTEIRO + [('total', 0)]:
+        latencias = todas if caminho == 'total' else [l for lista, _ in resultados for l in lista[caminho]]
+        if caminho != 'total':
+            todas.extend(latencias)
+        print(f"{caminho[:48]:<48} {len(latencias):>6} {len(latencias) / duracao:>8.1f} "
+              f"{percentil(latencias, 0.50) * 1000:>8.1f} {percentil(latencias, 0.95) * 1000:>8.1f} "
+              f"{percentil(latencias, 0.99) * 1000:>8.1f}")
+    print(f"[INFO] Erros: {erros}")
@@ -0,0 +1,123 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import escrita
+import backup_data
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco novo em tmp_path, com os backups em tmp_path/backups"""
+    database._pool.fechar()
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'salas.db'))
+    monkeypatch.setattr(backup_data, 'BACKUP_DIR', str(tmp_path / 'backups'))
+    os.makedirs(backup_data.BACKUP_DIR)
+    assert database.inicializar_banco()
+    conn = database.conexao_dedicada()
+    yield conn
+    conn.close()
+    # A thread de escrita guarda a conexão com o banco deste teste
+    escrita.encerrar()
+    database._pool.fechar()
+
+
+def _reservar(conn, nome, sala_id=1, data='2025-03-10', periodo='matutino'):
+    cursor = conn.execute('''
+        INSERT INTO Reservas (nome, matricula, setor_id, sala_id, data, periodo, user_id)
+        VALUES (?, '123', 1, ?, ?, ?, 1)
+    ''', (nome, sala_id, data, periodo))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def _reservas(conn):
+    return conn.execute('SELECT nome FROM Reservas ORDER BY id').fetchall()
+
+
+def test_incremental_com_turno_excluido_e_reservado_de_novo(banco):
+    antiga = _reservar(banco, 'antiga')
+    base = backup_data.exportar_ndjson()
+
+    # Mesma sala, data e turno liberados e ocupados de novo na mesma janela
+    banco.execute('DELETE FROM Reservas WHERE id = ?', (antiga,))
+    banco.commit()
+    _reservar(banco, 'nova')
+    incremental = backup_data.exportar_incremental()
+
+    assert backup_data.restaurar(base, [incremental])
+    assert _reservas(banco) == [('nova',)]
+    assert banco.execute('SELECT COUNT(*) FROM OcupacaoSala').fetchone()[0] == 1
+
+
+def test_restore_com_reservas_legadas_em_conflito(banco):
+    primeira = _reservar(banco, 'primeira')
+    # Conflito anterior à migração 2, que manteve as duas reservas
+    sql_trigger, = banco.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'trg_reservas_ocupacao_ins'").fetchone()
+    banco.execute('DROP TRIGGER trg_reservas_ocupacao_ins')
+    _reservar(banco, 'legada')
+    banco.execute(sql_trigger)
+    banco.commit()
+    base = backup_data.exportar_ndjson()
+
+    assert backup_data.restaurar(base, [])
+    assert _reservas(banco) == [('primeira',), ('legada',)]
+    # Como na migração 2: o turno fica com a primeira reserva
+    assert banco.execute('SELECT reserva_id FROM OcupacaoSala').fetchall() == [(primeira,)]
+    # Os triggers de ocupação voltam a barrar conflitos
+    with pytest.raises(database.sqlite3.IntegrityError):
+        _reservar(banco, 'conflito')
+
+
+def _json_legado(tmp_path, reservas):
+    """Backup no formato antigo de backup_to_json() com as reservas dadas"""
+    caminho = tmp_path / 'backup_dados_legado.json'
+    caminho.write_text(json.dumps({'timestamp': '2025-09-22T14:58:00', 'Reservas': [
+        {'id': id, 'nome': nome, 'matricula': '123', 'setor_id': 1, 'sala_id': 1, 'data': '2025-03-10',
+         'periodo': 'matutino', 'equipamentos': '', 'user_id': 1}
+        for id, nome in reservas
+    ]}), encoding='utf-8')
+    return str(caminho)
+
+
+def test_restore_json_legado_com_reservas_em_conflito(banco, tmp_path):
+    legado = _json_legado(tmp_path, [(100, 'primeira'), (101, 'legada')])
+
+    assert backup_data.restore_from_json(legado)
+    assert _reservas(banco) == [('primeira',), ('legada',)]
+    assert banco.execute('SELECT reserva_id FROM OcupacaoSala').fetchall() == [(100,)]
+    assert banco.execute('SELECT num_reservas FROM Users WHERE id = 1').fetchone() == (2,)
+    with pytest.raises(database.sqlite3.IntegrityError):
+        _reservar(banco, 'conflito')
+
+
+def test_restore_json_legado_invalida_a_marca(banco, tmp_path):
+    backup_data.exportar_ndjson()
+    _reservar(banco, 'N2', data='2025-03-11')
+    legado = _json_legado(tmp_path, [(100, 'legada')])
+
+    assert backup_data.restore_from_json(legado)
+    _reservar(banco, 'N3', data='2025-03-12')
+
+    # Continuar da marca antiga perderia N2 e as linhas mescladas
+    assert not os.path.exists(os.path.join(backup_data.BACKUP_DIR, 'marca.json'))
+    with pytest.raises(RuntimeError):
+        backup_data.exportar_incremental()
+    base = backup_data.exportar_ndjson()
+    assert backup_data.restaurar(base, [])
+    assert sorted(_reservas(banco)) == [('N2',), ('N3',), ('legada',)]
+
+
+def test_alteracoes_so_registradas_com_uma_base(banco):
+    _reservar(banco, 'sem base')
+    assert banco.execute('SELECT COUNT(*) FROM Alteracoes').fetchone() == (0,)
+
+    backup_data.exportar_ndjson()
+    _reservar(banco, 'com base', data='2025-03-11')
+    assert banco.execute('SELECT COUNT(*) FROM Alteracoes').fetchone()[0] > 0
@@ -0,0 +1,264 @@
+"""
+Views do painel administrativo e da gestão de usuários (blueprint 'usuarios').
+
+As regras de URL ficam em app.ROTAS_ADMIN: com APP_ADMIN_PREGUICOSO=1 este
+módulo só é importado na primeira requisição que chegar a uma delas.
+"""
+
+import os
+from flask import flash, g, jsonify, redirect, render_template, request, session, url_for
+from database import (conectar, conexao, adicionar_usuario, buscar_todos_usuarios, EscritaRecusada,
+                      excluir_usuario, alterar_usuario)
+import auditoria
+import escrita
+import perfil_sql
+from permissoes import requer_cargo
+
+DASHBOARD_PAGINA = int(os.environ.get('DASHBOARD_PAGINA', 20))
+
+
+@requer_cargo(['admin'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        cargo = request.form['cargo']
+
+        # Registros de usuários normais só podem ser cotead ou colaborador
+        if cargo not in ['cotead', 'colaborador']:
+            flash('Cargo inválido. Escolha cotead ou colaborador.', 'error')
+            return render_template('register.html', username=username)
+
+        ok, mensagem = adicionar_usuario(username, password, cargo)
+        if ok:
+            # Só um usuário de fato criado vira alvo do evento de auditoria
+            g.auditoria = {'target_username': username, 'target_cargo': cargo}
+            flash('Usuário registrado com sucesso! Faça login.', 'success')
+            return redirect(url_for('autenticacao.login'))
+        flash(f'Registro falhou. {mensagem}.', 'error')
+        return render_template('register.html', username=username)
+    return render_template('register.html')
+
+
+@requer_cargo(['admin'])
+def register_admin():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        cargo = request.form['cargo']
+
+        ok, mensagem = adicionar_usuario(username, password, cargo)
+        if ok:
+            # Só um usuário de fato criado vira alvo do evento de auditoria
+            g.auditoria = {'target_username': username, 'target_cargo': cargo}
+            flash('Usuário registrado com sucesso!', 'success')
+            return redirect(url_for('usuarios.admin_dashboard'))
+        flash(f'Registro falhou. {mensagem}.', 'error')
+        return render_template('register_admin.html', username=username)
+    return render_template('register_admin.html')
+
+
+def _pagina_reservas(cursor, apos_data=None, apos_id=None, limite=DASHBOARD_PAGINA):
+    """Página de reservas mais recentes com paginação por cursor (data, id)"""
+    filtro = ''
+    params = []
+    if apos_data is not None and apos_id is not None:
+        filtro = 'WHERE (r.data, r.id) < (?, ?)'
+        params = [apos_data, apos_id]
+    cursor.execute(f'''
+        SELECT r.id, r.nome, s.nome as sala_nome, r.data, r.periodo
+        FROM Reservas r
+        JOIN Sala s ON r.sala_id = s.id
+        {filtro}
+        ORDER BY r.data DESC, r.id DESC
+        LIMIT ?
+    ''', params + [limite + 1])
+    reservas = cursor.fetchall()
+    proximo = None
+    if len(reservas) > limite:
+        reservas = reservas[:limite]
+        proximo = {'apos_data': reservas[-1][3], 'apos_id': reservas[-1][0]}
+    return reservas, proximo
+
+
+def _pagina_usuarios(cursor, apos_username=None, apos_id=None, limite=DASHBOARD_PAGINA):
+    """Página de usuários ativos em ordem alfabética com paginação por cursor (username, id)"""
+    filtro = ''
+    params = []
+    if apos_username is not None and apos_id is not None:
+        filtro = 'AND (u.username, u.id) > (?, ?)'
+        params = [apos_username, apos_id]
+    cursor.execute(f'''
+        SELECT u.id, u.username, u.cargo
+        FROM Users u
+        WHERE u.active = 1 {filtro}
+        ORDER BY u.username, u.id
+        LIMIT ?
+    ''', params + [limite + 1])
+    usuarios = cursor.fetchall()
+    proximo = None
+    if len(usuarios) > limite:
+        usuarios = usuarios[:limite]
+        proximo = {'apos_username': usuarios[-1][1], 'apos_id': usuarios[-1][0]}
+    return usuarios, proximo
+
+
+@requer_cargo(['admin','cotead','colaborador'])
+def admin_dashboard():
+    conn = conectar()
+    cursor = conn.cursor()
+
+    try:
+        # Totais calculados no banco, sem carregar as tabelas
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM Users WHERE active = 1),
+                (SELECT COUNT(*) FROM Reservas),
+                (SELECT COUNT(*) FROM Equipamentos)
+        ''')
+        total_usuarios, total_reservas, total_equipamentos = cursor.fetchone()
+
+        # Primeira página das reservas e dos usuários; as demais vêm via JSON
+        reservas, proximo_reservas = _pagina_reservas(cursor)
+        usuarios, proximo_usuarios = _pagina_usuarios(cursor)
+
+        cursor.execute('SELECT id, nome, quantidade FROM Equipamentos ORDER BY nome')
+        equipamentos = cursor.fetchall()
+
+        return render_template('admin_dashboard.html',
+                            reservas=reservas,
+                            usuarios=usuarios,
+                            equipamentos=equipamentos,
+                            total_usuarios=total_usuarios,
+                            total_reservas=total_reservas,
+                            total_equipamentos=total_equipamentos,
+                            proximo_reservas=proximo_reservas,
+                            proximo_usuarios=proximo_usuarios)
+    except Exception as e:
+        flash(f'Erro ao carregar dashboard: {str(e)}', 'error')
+        return redirect(url_for('index'))
+    finally:
+        conn.close()
+
+
+@requer_cargo(['admin','cotead','colaborador'])
+def admin_dashboard_reservas():
+    with conexao() as conn:
+        reservas, proximo = _pagina_reservas(
+            conn.cursor(),
+            request.args.get('apos_data'),
+            request.args.get('apos_id', type=int))
+    return jsonify({
+        'itens': [{
+            'id': r[0],
+            'nome': r[1],
+            'sala': r[2],
+            'data': r[3],
+            'periodo': r[4],
+            'editar_url': url_for('reservas.editar_reserva', id=r[0]),
+            'excluir_url': url_for('reservas.deletar_reserva', id=r[0]),
+        } for r in reservas],
+        'proximo': proximo
+    })
+
+
+@requer_cargo(['admin','cotead','colaborador'])
+def admin_dashboard_usuarios():
+    with conexao() as conn:
+        usuarios, proximo = _pagina_usuarios(
+            conn.cursor(),
+            request.args.get('apos_username'),
+            request.args.get('apos_id', type=int))
+    return jsonify({
+        'itens': [{
+            'id': u[0],
+            'username': u[1],
+            'cargo': u[2],
+            'editar_url': url_for('usuarios.editar_usuario', id=u[0]),
+            'excluir_url': url_for('usuarios.deletar_usuario', id=u[0]) if u[1] != 'admin@ses' else None,
+        } for u in usuarios],
+        'proximo': proximo
+    })
+
+
+@requer_cargo(['admin'])
+def usuarios():
+    try:
+        usuarios = buscar_todos_usuarios()
+        return render_template('usuarios.html', usuarios=usuarios)
+    except Exception as e:
+        flash(f'Erro ao carregar usuários: {str(e)}', 'error')
+        return redirect(url_for('usuarios.admin_dashboard'))
+
+
+@requer_cargo(['admin'])
+def deletar_usuario(id):
+    # Verificar se está tentando excluir a si mesmo
+    if id == session.get('user_id'):
+        flash('Não é possível excluir seu próprio usuário.', 'error')
+        return redirect(url_for('usuarios.usuarios'))
+
+    try:
+        username, cargo, reservas_removidas = escrita.executar(excluir_usuario, id)
+        g.auditoria = {'target_username': username, 'target_cargo': cargo,
+                       'reservas_removidas': reservas_removidas}
+        if reservas_removidas > 0:
+            flash(f'Usuário {username} excluído com sucesso! {reservas_removidas} reservas foram removidas.', 'success')
+        else:
+            flash(f'Usuário {username} excluído com sucesso!', 'success')
+    except EscritaRecusada as e:
+        flash(str(e), 'error')
+    except Exception as e:
+        print(f"Erro ao excluir usuário: {e}")
+        flash(f'Erro ao excluir usuário: {str(e)}', 'error')
+
+    return redirect(url_for('usuarios.usuarios'))
+
+
+@requer_cargo(['admin'])
+def editar_usuario(id):
+    if request.method == 'POST':
+        try:
+            g.auditoria = {'target_username': request.form['username'], 'target_cargo': request.form['cargo']}
+            escrita.executar(alterar_usuario, id, request.form['username'], request.form['cargo'])
+            flash('Usuário atualizado com sucesso!', 'success')
+        except EscritaRecusada as e:
+            flash(str(e), 'error')
+        except Exception as e:
+            print(f"Erro ao atualizar usuário: {e}")
+            flash('Erro ao atualizar usuário.', 'error')
+
+        return redirect(url_for('usuarios.usuarios'))
+
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM Users WHERE id = ?', (id,))
+    usuario = cursor.fetchone()
+    conn.close()
+
+    return render_template('editar_usuario.html', usuario=usuario)
+
+
+@requer_cargo(['admin'])
+def consultar_auditoria():
+    """Eventos de auditoria filtrados por alvo e período (JSON)"""
+    # Eventos ainda no buffer entram na consulta
+    auditoria.descarregar()
+    eventos = auditoria.consultar(alvo_tipo=request.args.get('alvo_tipo'),
+                                  alvo_id=request.args.get('alvo_id', type=int),
+                                  target_username=request.args.get('usuario'),
+                                  desde=request.args.get('desde'), ate=request.args.get('ate'),
+                                  limite=min(request.args.get('limite', 100, type=int), 1000),
+                                  arquivo=request.args.get('arquivo') == '1')
+    return jsonify(eventos)
+
+
+@requer_cargo(['admin'])
+def consultar_perfil_sql():
+    """Top-N consultas do perfil SQL (SQL_PERFIL=1), somadas entre os workers (JSON)"""
+    ordem = request.args.get('ordem', 'total_ms')
+    if ordem not in ('total_ms', 'p95_ms', 'chamadas', 'linhas'):
+        ordem = 'total_ms'
+    return jsonify(perfil_sql.relatorio(limite=min(request.args.get('top', 20, type=int), 200),
+                                        ordem=ordem,
+                                        lentas=min(request.args.get('lentas', 20, type=int), 200)))